@@ -1,80 +1,158 @@
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import cProfile
+import math
 import os
-from dotenv import load_dotenv
-import psycopg2
-import psycopg2.extras
+import time
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from flask_cors import CORS
+from db import connection, pool_stats
+from events_cache import EventsCache, events_etag
+from events_query import InvalidQuery, fetch_events_page, parse_filters, stream_events
+import ledger
+from metrics import registry
 
-app = Flask(__name__)
-CORS(app)
+# With PROFILE_REQUESTS=1, a request sent with ?profile=1 or an X-Profile header
+# is run under cProfile and its stats dumped to PROFILE_DIR (see X-Profile-File)
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "profiles"))
 
-# Load environment variables from .env file
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+app = Flask(__name__)
+CORS(app, expose_headers=["ETag", "X-Events-Version", "X-Next-Cursor", "Idempotent-Replayed"])
 
-# Helper function to get a database connection
+# Helper function to check a connection out of the shared pool.
+# Use it as a context manager: the connection goes back to the pool on exit.
 def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+    return connection()
+
+# Every request is timed into http_request_seconds, labelled by endpoint, method
+# and status; 5xx responses also count towards http_request_errors_total.
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILE_REQUESTS and (request.args.get("profile") == "1" or request.headers.get("X-Profile")):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
 
-# New endpoint to retrieve events data from the event table
+@app.after_request
+def record_request(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{request.endpoint or 'unknown'}-{time.time_ns()}.prof")
+        profiler.dump_stats(path)
+        response.headers["X-Profile-File"] = path
+    started = g.pop("request_started", None)
+    if started is not None and request.endpoint != "metrics_route":
+        labels = {"endpoint": request.endpoint or "unknown", "method": request.method, "status": response.status_code}
+        registry.observe("http_request_seconds", time.perf_counter() - started, help_text="Duration of API requests", **labels)
+        if response.status_code >= 500:
+            registry.inc("http_request_errors_total", help_text="API requests that failed with a 5xx", **labels)
+    return response
+
+
+# Serialized /api/events bodies, reused until fetch_h2h bumps the events version
+events_cache = EventsCache(app.json.dumps)
+
+# New endpoint to retrieve events data from the event table.
+# Responses carry an ETag and X-Events-Version; pass ?since=<version> to get
+# only the rows written after that version. Filters: sport, team, from, to
+# (ISO 8601); paginate with limit and the X-Next-Cursor value as ?after=.
 @app.route('/api/events', methods=['GET'])
 def events_route():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    # Adjust the query based on your table/schema naming.
-    # If your table is "event" in the public schema:
-    # cur.execute("SELECT sport, home_team, away_team FROM event;")
-    # If your table is in a schema named "event" with a table named "event":
-    cur.execute("SELECT sport, home_team, away_team, event_time, home_team_odds, away_team_odds FROM events;")
-    events = cur.fetchall()
-    cur.close()
-    conn.close()
-    events_list = [dict(event) for event in events]
-   # print(events_list)
-    return jsonify(events_list)
+    try:
+        filters = parse_filters(request.args)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    since = filters.get("since")
+    # Anything beyond ?since= goes to the database instead of the cached body
+    query = request.query_string if set(filters) - {"since"} else None
+
+    version = events_cache.version()
+    etag = events_etag(version, since, query)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    elif query:
+        rows, next_cursor = fetch_events_page(filters)
+        response = Response(app.json.dumps(rows), mimetype="application/json")
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    else:
+        version, body = events_cache.body(version, since)
+        etag = events_etag(version, since)
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["X-Events-Version"] = str(version)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
+# Streams every matching event (same filters as /api/events, no limit) through a
+# server-side cursor. ?format=ndjson gives one JSON object per line.
+@app.route('/api/events/export', methods=['GET'])
+def events_export_route():
+    try:
+        filters = parse_filters(request.args)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    filters.pop("limit", None)
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "ndjson"):
+        return jsonify({"error": "Invalid format"}), 400
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(stream_events(filters, app.json.dumps, fmt)), mimetype=mimetype)
+
+
+# Debits the profile and records the investment atomically. Send an
+# Idempotency-Key header (or "idempotency_key" in the body) so a retried
+# request returns the original investment instead of debiting again.
 @app.route('/api/invest', methods=['POST'])
 def invest():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
     auth0_id = data.get("auth0_id")
     amount = data.get("amount")
-    
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+
     if not auth0_id or not amount:
         return jsonify({"error": "Missing required fields"}), 400
+    if not isinstance(auth0_id, str) or not isinstance(idempotency_key, (str, type(None))):
+        return jsonify({"error": "Invalid auth0_id or idempotency_key"}), 400
 
     try:
         amount = float(amount)
-    except ValueError:
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid amount"}), 400
+    if not math.isfinite(amount) or amount <= 0:
         return jsonify({"error": "Invalid amount"}), 400
 
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        # Begin a transaction
-        # Insert new investment record
-        cur.execute("""
-            INSERT INTO investments (auth0_id, amount, start_date, starting_balance)
-            VALUES (%s, %s, NOW(), (SELECT balance FROM profiles WHERE auth0_id = %s))
-            RETURNING id;
-        """, (auth0_id, amount, auth0_id))
-        investment_id = cur.fetchone()[0]
-
-        # Update the user's profile: deduct investment amount from balance, and add to money_in.
-        cur.execute("""
-            UPDATE profiles 
-            SET balance = balance - %s, money_in = money_in + %s 
-            WHERE auth0_id = %s;
-        """, (amount, amount, auth0_id))
-
-        conn.commit()
-        return jsonify({"investment_id": investment_id}), 200
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    with get_db_connection() as conn:
+        try:
+            investment_id, replayed = ledger.invest(conn, auth0_id, amount, idempotency_key)
+        except ledger.UnknownProfile as e:
+            return jsonify({"error": str(e)}), 404
+        except ledger.InsufficientBalance as e:
+            return jsonify({"error": str(e)}), 409
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    response = jsonify({"investment_id": investment_id})
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response, 200
+
+
+# Pool wait-time and checkout counters, used to size DB_POOL_MIN / DB_POOL_MAX under load
+@app.route('/api/db-pool', methods=['GET'])
+def db_pool_route():
+    return jsonify(pool_stats())
+
+
+# Prometheus scrape target: request latency and errors, DB pool and Odds API quota gauges
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+import numpy as np
+from lexicon import score_articles, tokenize
+
+STORE_PATH = os.getenv('ARTICLE_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "articles.sqlite3"))
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+# Estimated Jaccard similarity above which two articles count as the same story
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('ARTICLE_NEAR_DUP_THRESHOLD', '0.8'))
+
+# Fixed seed: signatures are persisted, so the hash family must not change between runs
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240301)
+_A = _rng.randint(1, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+
+
+def content_hash(tokens):
+    return hashlib.sha1(" ".join(tokens).encode("utf-8")).hexdigest()
+
+
+def minhash(tokens):
+    """MinHash signature over word shingles of the normalized article."""
+    if len(tokens) <= SHINGLE_SIZE:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0)
+
+
+def _bands(signature):
+    for band in range(BANDS):
+        yield band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes().hex()
+
+
+def dedup_ratio(stats):
+    """Share of the articles counted in `stats` (ArticleStore.stats, or a sum of them) that needed no scoring."""
+    seen = stats.get("seen", 0)
+    return (seen - stats.get("scored", 0)) / seen if seen else 0.0
+
+
+class ArticleStore:
+    """
+    Content-addressed memo of article sentiment, persisted in SQLite.
+    Articles are keyed by a hash of their normalized text, so an article is
+    scored once per lifetime however many sites, teams or events it shows up
+    under. Near-duplicates (syndicated copies with small edits) are found with
+    MinHash + LSH banding and collapse onto the first copy seen.
+    """
+
+    def __init__(self, path=STORE_PATH, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # Several scoring processes can share one store file
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS articles (
+                hash TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL,
+                score REAL,
+                mentions TEXT NOT NULL DEFAULT '[]',
+                signature BLOB
+            );
+            CREATE TABLE IF NOT EXISTS lsh (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS lsh_bucket_idx ON lsh (band, bucket);
+        """)
+        self._db.commit()
+        self.stats = {"seen": 0, "exact_duplicates": 0, "near_duplicates": 0, "scored": 0}
+
+    def dedup_ratio(self):
+        """Share of articles seen that did not need scoring."""
+        with self._lock:
+            return dedup_ratio(self.stats)
+
+    def _canonical(self, hash_):
+        row = self._db.execute("SELECT canonical FROM articles WHERE hash = ?", (hash_,)).fetchone()
+        return row[0] if row else None
+
+    def _near_duplicate(self, signature):
+        candidates = set()
+        for band, bucket in _bands(signature):
+            candidates.update(h for (h,) in self._db.execute(
+                "SELECT hash FROM lsh WHERE band = ? AND bucket = ?", (band, bucket)
+            ))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            (blob,) = self._db.execute("SELECT signature FROM articles WHERE hash = ?", (candidate,)).fetchone()
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def score(self, texts, matcher=None):
+        """
+        Return [(score, mentions), ...] for `texts`, scoring only articles never
+        seen before (exactly or nearly). With a TeamMatcher, the teams each
+        article mentions are recorded and returned as a sorted list.
+        """
+        return [(score, mentions) for _, score, mentions in self.score_keyed(texts, matcher)]
+
+    def score_keyed(self, texts, matcher=None):
+        """score(), with each result led by the hash of the article's canonical copy."""
+        with self._lock:
+            canonicals = []
+            new_texts = {}  # canonical hash -> text still to be scored
+            mentions = {}
+            for text in texts:
+                tokens = tokenize(text)
+                hash_ = content_hash(tokens)
+                self.stats["seen"] += 1
+                canonical = self._canonical(hash_)
+                if canonical is not None:
+                    self.stats["exact_duplicates"] += 1
+                else:
+                    signature = minhash(tokens)
+                    canonical = self._near_duplicate(signature)
+                    if canonical is not None:
+                        self.stats["near_duplicates"] += 1
+                        self._db.execute(
+                            "INSERT OR IGNORE INTO articles (hash, canonical) VALUES (?, ?)", (hash_, canonical)
+                        )
+                    else:
+                        canonical = hash_
+                        new_texts[hash_] = text
+                        self._db.execute(
+                            "INSERT OR IGNORE INTO articles (hash, canonical, signature) VALUES (?, ?, ?)",
+                            (hash_, hash_, signature.tobytes()),
+                        )
+                        self._db.executemany(
+                            "INSERT INTO lsh (band, bucket, hash) VALUES (?, ?, ?)",
+                            [(band, bucket, hash_) for band, bucket in _bands(signature)],
+                        )
+                canonicals.append(canonical)
+                if matcher is not None:
+                    mentions.setdefault(canonical, set()).update(matcher.teams_in(text))
+
+            # Everything new is scored in one vectorized batch
+            if new_texts:
+                scores = score_articles(list(new_texts.values())).tolist()
+                self._db.executemany(
+                    "UPDATE articles SET score = ? WHERE hash = ?", list(zip(scores, new_texts))
+                )
+                self.stats["scored"] += len(new_texts)
+
+            results = {}
+            for canonical in set(canonicals):
+                score, stored = self._db.execute(
+                    "SELECT score, mentions FROM articles WHERE hash = ?", (canonical,)
+                ).fetchone()
+                merged = set(json.loads(stored)) | mentions.get(canonical, set())
+                if matcher is not None and len(merged) != len(json.loads(stored)):
+                    self._db.execute(
+                        "UPDATE articles SET mentions = ? WHERE hash = ?", (json.dumps(sorted(merged)), canonical)
+                    )
+                results[canonical] = (score, sorted(merged))
+            self._db.commit()
+        return [(canonical, *results[canonical]) for canonical in canonicals]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Offline backtester for the staking rules. Replays settled events through
+decide_bets' vectorized staking (staking.stake_batch) or the sentiment
+model's Kelly rule, for every combination of parameters in a grid, and
+reports ROI, max drawdown and the bankroll curve of each.
+
+    python backtest.py --export history.csv            # one-off, reads the DB
+    python backtest.py history.csv --threshold 1,1.5,2 --edge 0.02,0.05 --fractional-kelly 0.25,0.5
+    python backtest.py history.csv --strategy sentiment --alpha 0.25,0.5,1 --threshold 0,0.05,0.1
+
+Replays read only the history file: no network or database access.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+import concurrent.futures
+from datetime import datetime, timezone
+import numpy as np
+from staking import HOME, stake_batch
+
+HISTORY_FIELDS = ("game_id", "event_time", "home_odds", "away_odds", "winner", "sentiment_diff")
+WINNERS = {"home": 0, "away": 1, "draw": 2}
+
+ODDS_GRID = {"threshold": [1.5], "edge": [0.05], "fractional_kelly": [0.5], "max_exposure": [1.0]}
+SENTIMENT_GRID = {"alpha": [0.5], "threshold": [0.05], "fractional_kelly": [1.0], "max_exposure": [1.0]}
+
+
+def export_history(path):
+    """
+    Write settled events (closing best odds from events, results from the
+    completed_games cache, sentiment from predictions) to a CSV for replay.
+    """
+    from db import connection
+    from paper_bet import game_winner
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT e.game_id, e.event_time, e.home_team, e.away_team, e.home_team_odds, e.away_team_odds,
+                   g.scores, p.sentiment_diff
+            FROM events e
+            JOIN completed_games g ON g.game_id = e.game_id
+            LEFT JOIN predictions p
+              ON p.sport = e.sport AND p.home_team = e.home_team
+             AND p.away_team = e.away_team AND p.event_time = e.event_time
+            WHERE e.home_team_odds IS NOT NULL AND e.away_team_odds IS NOT NULL
+            ORDER BY e.event_time, e.game_id
+            """
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        cur.close()
+
+    written = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HISTORY_FIELDS)
+        for game_id, event_time, home_team, away_team, home_odds, away_odds, scores, sentiment_diff in rows:
+            winner = game_winner({"scores": scores})
+            if winner is None:
+                continue
+            side = "draw" if winner == "draw" else "home" if winner.lower() == home_team.lower() else "away"
+            writer.writerow((game_id, event_time.isoformat(), home_odds, away_odds, side,
+                             "" if sentiment_diff is None else sentiment_diff))
+            written += 1
+    print(f"Exported {written} settled events to {path}")
+    return written
+
+
+def load_history(path):
+    """
+    Read a history CSV (HISTORY_FIELDS columns) into time-ordered arrays.
+    `day` numbers the distinct UTC days: events on one day are staked together,
+    from the same bankroll, the way decide_bets stakes one run's events.
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    rows.sort(key=lambda row: row["event_time"])
+    times = [datetime.fromisoformat(row["event_time"].replace("Z", "+00:00")) for row in rows]
+    times = [t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in times]
+    days = np.array([t.timestamp() // 86400 for t in times], dtype=np.int64)
+    _, day = np.unique(days, return_inverse=True)
+    return {
+        "day": day.astype(np.int64),
+        "home_odds": np.array([float(row["home_odds"]) for row in rows]),
+        "away_odds": np.array([float(row["away_odds"]) for row in rows]),
+        "winner": np.array([WINNERS[row["winner"]] for row in rows], dtype=np.int64),
+        "sentiment_diff": np.array([float(row["sentiment_diff"]) if row.get("sentiment_diff") else np.nan for row in rows]),
+    }
+
+
+def odds_fractions(history, threshold, edge, fractional_kelly):
+    """decide_bets' side and Kelly fraction for every event."""
+    stakes = stake_batch(
+        history["home_odds"], history["away_odds"], 1.0,
+        threshold=threshold, edge=edge, fractional_kelly=fractional_kelly, max_exposure=None,
+    )
+    return stakes["side"], stakes["odds"], stakes["kelly_fraction"]
+
+
+def sentiment_fractions(history, alpha, threshold, fractional_kelly):
+    """
+    The sentiment pipeline's rule: back the home team with Kelly stakes on
+    sigmoid(alpha * sentiment_diff) when it beats the implied probability by
+    more than `threshold`. Events without sentiment are never bet.
+    """
+    odds = history["home_odds"]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        p = 1.0 / (1.0 + np.exp(-alpha * history["sentiment_diff"]))
+        b = odds - 1.0
+        kelly = ((b * p - (1.0 - p)) / b) * fractional_kelly
+    take = np.isfinite(kelly) & (b > 0) & (p - 1.0 / odds > threshold)
+    kelly = np.clip(np.where(take, kelly, 0.0), 0.0, 1.0)
+    return np.full(len(odds), HOME), odds, kelly
+
+
+def simulate(history, strategy, params, bankroll=1000.0):
+    """
+    Replay the history under one parameter set. Fractions are capped per day
+    at max_exposure, as stake_batch caps a run's stakes; each day's bets are
+    staked from that morning's bankroll, and days compound. Without a cap a
+    day can stake more than the bankroll; a day that loses it all ruins the
+    run, and the bankroll stays at 0 from then on.
+    """
+    params = dict(params)
+    max_exposure = params.pop("max_exposure", None)
+    if strategy == "sentiment":
+        side, odds, fraction = sentiment_fractions(history, **params)
+    else:
+        side, odds, fraction = odds_fractions(history, **params)
+
+    day = history["day"]
+    n_days = int(day.max()) + 1 if len(day) else 0
+    if max_exposure is not None:
+        exposure = np.bincount(day, weights=fraction, minlength=n_days)
+        scale = np.where(exposure > max_exposure, max_exposure / np.where(exposure > 0, exposure, 1.0), 1.0)
+        fraction = fraction * scale[day]
+
+    won = history["winner"] == side
+    # Per unit of bankroll staked: odds - 1 on a win, -1 on a loss or draw
+    returns = np.where(won, odds - 1.0, -1.0)
+    # Losses are capped at the bankroll: a ruined day's factor is 0, and the cumprod keeps it there
+    day_return = np.maximum(np.bincount(day, weights=fraction * returns, minlength=n_days), -1.0)
+    day_staked = np.bincount(day, weights=fraction, minlength=n_days)
+    curve = bankroll * np.concatenate(([1.0], np.cumprod(1.0 + day_return)))
+    start_of_day = curve[:-1]
+    staked = float((start_of_day * day_staked).sum())
+    profit = float(curve[-1] - bankroll)
+    peak = np.maximum.accumulate(curve)
+    # Nothing is staked once the bankroll is gone
+    bets = (fraction > 0) & (start_of_day[day] > 0)
+    return {
+        "strategy": strategy,
+        "params": dict(params, max_exposure=max_exposure),
+        "bets": int(bets.sum()),
+        "hit_rate": float(won[bets].mean()) if bets.any() else 0.0,
+        "staked": staked,
+        "profit": profit,
+        "roi": profit / staked if staked else 0.0,
+        "max_drawdown": float(((peak - curve) / peak).max()),
+        "final_bankroll": float(curve[-1]),
+        "ruined": bool(curve[-1] <= 0),
+        "curve": curve.tolist(),
+    }
+
+
+# Each worker process loads the history once instead of receiving it per task
+_history = None
+
+
+def _init_worker(path):
+    global _history
+    _history = load_history(path)
+
+
+def _simulate_in_worker(task):
+    strategy, params, bankroll = task
+    return simulate(_history, strategy, params, bankroll)
+
+
+def run_grid(path, strategy, grid, bankroll=1000.0, workers=None):
+    """Simulate every combination in `grid` ({param: [values]}) on a process pool."""
+    names = list(grid)
+    tasks = [(strategy, dict(zip(names, values)), bankroll) for values in itertools.product(*grid.values())]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+        return list(pool.map(_simulate_in_worker, tasks, chunksize=chunksize))
+
+
+def _values(text):
+    return [None if value == "none" else float(value) for value in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest staking parameters on settled events.")
+    parser.add_argument("history", nargs="?", help="history CSV (see --export)")
+    parser.add_argument("--export", metavar="PATH", help="write settled events from the database to PATH and exit")
+    parser.add_argument("--strategy", choices=("odds", "sentiment"), default="odds")
+    parser.add_argument("--threshold", type=_values)
+    parser.add_argument("--edge", type=_values)
+    parser.add_argument("--fractional-kelly", type=_values)
+    parser.add_argument("--max-exposure", type=_values)
+    parser.add_argument("--alpha", type=_values)
+    parser.add_argument("--bankroll", type=float, default=1000.0)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--top", type=int, default=10, help="parameter sets to print, best ROI first")
+    parser.add_argument("--json", metavar="PATH", help="write every result, bankroll curves included, to PATH")
+    args = parser.parse_args()
+
+    if args.export:
+        export_history(args.export)
+        sys.exit(0)
+    if not args.history:
+        parser.error("a history CSV is required")
+
+    grid = dict(SENTIMENT_GRID if args.strategy == "sentiment" else ODDS_GRID)
+    for name in grid:
+        values = getattr(args, name)
+        if values is not None:
+            grid[name] = values
+
+    started = time.perf_counter()
+    results = run_grid(args.history, args.strategy, grid, args.bankroll, args.workers)
+    elapsed = time.perf_counter() - started
+    results.sort(key=lambda result: result["roi"], reverse=True)
+    print(f"{len(results)} parameter sets in {elapsed:.2f}s")
+    for result in results[:args.top]:
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(
+            f"{params}: {result['bets']} bets, ROI {result['roi']:.2%}, "
+            f"max drawdown {result['max_drawdown']:.2%}, final bankroll {result['final_bankroll']:.2f}"
+            + (" (ruined)" if result["ruined"] else "")
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f)
+        print(f"Results written to {args.json}")
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the backend hot paths on synthetic data: Odds API ingestion,
+staking, sentiment scoring and the /api/events route. Each benchmark runs at
+every requested scale and reports throughput, p50/p99 latency and peak Python
+memory; results go to a JSON file that can be diffed across commits.
+
+    python bench.py                                   # CPU-only benchmarks, 1k/10k/100k
+    python bench.py --db --output before.json         # plus Postgres-backed ones (DATABASE_URL)
+    python bench.py --only lexicon --compare before.json
+
+--db writes to the database in DATABASE_URL: point it at a local Postgres.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# `iterations` overrides --repeat, e.g. for per-request latency on the API
+Benchmark = namedtuple("Benchmark", "name setup run teardown needs_db max_scale iterations")
+
+BOOKMAKERS = [f"Bookmaker {i}" for i in range(12)]
+FILLER = ("the team played a match against their rivals on saturday as fans watched the coach said "
+          "that the season was long and the league table is close with games left").split()
+SEED = 1234
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def odds_payloads(n_events, regions=2, bookmakers_per_region=6):
+    """Per-region Odds API h2h responses for `n_events` games, as fetch_odds receives them."""
+    rng = random.Random(SEED)
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    games = [
+        {
+            "id": f"bench-{i}",
+            "sport_key": "basketball_nba",
+            "sport_title": "NBA",
+            "commence_time": (start + timedelta(minutes=15 * i)).isoformat().replace("+00:00", "Z"),
+            "home_team": f"Home {i}",
+            "away_team": f"Away {i}",
+        }
+        for i in range(n_events)
+    ]
+    payloads = []
+    for region in range(regions):
+        books = BOOKMAKERS[region * bookmakers_per_region:(region + 1) * bookmakers_per_region]
+        payload = []
+        for game in games:
+            p = rng.uniform(0.2, 0.8)
+            bookmakers = []
+            for title in books:
+                margin = rng.uniform(1.02, 1.08)
+                bookmakers.append({
+                    "key": title.lower().replace(" ", "_"),
+                    "title": title,
+                    "markets": [{"key": "h2h", "outcomes": [
+                        {"name": game["home_team"], "price": round(1 / (p * margin), 2)},
+                        {"name": game["away_team"], "price": round(1 / ((1 - p) * margin), 2)},
+                    ]}],
+                })
+            payload.append(dict(game, bookmakers=bookmakers))
+        payloads.append(payload)
+    return payloads
+
+
+def event_rows(events, lines):
+    """fetch_h2h's row building, for the ingest benchmarks."""
+    rows = []
+    for event, line in zip(events, lines):
+        home_odds, home_book = line["best"].get(event["home_team"], (None, "Unknown Bookmaker"))
+        away_odds, away_book = line["best"].get(event["away_team"], (None, "Unknown Bookmaker"))
+        rows.append((event["id"], event["sport_title"], event["home_team"], event["away_team"],
+                     home_odds, away_odds, event["commence_time"], home_book, away_book))
+    return rows
+
+
+def article_corpus(n_articles, words=150):
+    from lexicon import negation_words, sentiment_lexicon
+    rng = random.Random(SEED)
+    vocab = FILLER * 4 + list(sentiment_lexicon) + list(negation_words)
+    return [" ".join(rng.choice(vocab) for _ in range(words)) + f". Story {i}." for i in range(n_articles)]
+
+
+def synthetic_events(n_events):
+    from sentiment import Event
+    rng = np.random.default_rng(SEED)
+    p = rng.uniform(0.2, 0.8, n_events)
+    home = np.round(1 / (p * 1.05), 2).tolist()
+    away = np.round(1 / ((1 - p) * 1.05), 2).tolist()
+    now = datetime.now(timezone.utc)
+    return [
+        Event(f"bench-{i}", "NBA", f"Home {i}", f"Away {i}", home[i], away[i], now, "Bookmaker 0", "Bookmaker 1")
+        for i in range(n_events)
+    ]
+
+
+# --- benchmarks: setup(scale) -> state, run(state) -> items processed ---
+
+def setup_merge_shop(scale):
+    return odds_payloads(scale)
+
+
+def run_merge_shop(payloads):
+    from line_shopping import shop_lines
+    from odds_fetcher import merge_events
+    events = merge_events(payloads)
+    event_rows(events, shop_lines(events, "h2h"))
+    return len(events)
+
+
+def setup_upsert(scale):
+    from line_shopping import shop_lines
+    from odds_fetcher import merge_events
+    from schema import ensure_schema
+    ensure_schema()
+    events = merge_events(odds_payloads(scale))
+    return event_rows(events, shop_lines(events, "h2h"))
+
+
+def run_upsert(rows):
+    # Rolled back, so every iteration inserts into the same table state
+    from db import connection
+    from events_cache import bump_events_version
+    from ingest import upsert_events
+    with connection() as conn:
+        cur = conn.cursor()
+        upsert_events(cur, rows, bump_events_version(cur))
+        conn.rollback()
+        cur.close()
+    return len(rows)
+
+
+def run_decide_bets(events):
+    from sentiment import decide_bets
+    decide_bets(events, 1000)
+    return len(events)
+
+
+def run_score_articles(texts):
+    from lexicon import score_articles
+    score_articles(texts)
+    return len(texts)
+
+
+def run_analyze_sentiment(texts):
+    from lexicon import analyze_sentiment
+    for text in texts:
+        analyze_sentiment(text)
+    return len(texts)
+
+
+def run_article_store(texts):
+    # A fresh in-memory store each time, so every article is new
+    from article_store import ArticleStore
+    store = ArticleStore(":memory:")
+    store.score(texts)
+    store.close()
+    return len(texts)
+
+
+API_REQUESTS = 200
+API_PATHS = ["/api/events", "/api/events?sport=NBA&limit=100"]
+
+
+def setup_events_api(scale):
+    from app import app, events_cache
+    from db import connection
+    from events_cache import bump_events_version
+    from ingest import upsert_events
+    rows = setup_upsert(scale)
+    with connection() as conn:
+        cur = conn.cursor()
+        upsert_events(cur, rows, bump_events_version(cur))
+        conn.commit()
+        cur.close()
+    events_cache.invalidate()
+    # Requests alternate between the cached full body and a filtered page
+    client = app.test_client()
+    for path in API_PATHS:
+        client.get(path)
+    return {"client": client, "requests": 0}
+
+
+def run_events_api(state):
+    state["client"].get(API_PATHS[state["requests"] % len(API_PATHS)])
+    state["requests"] += 1
+    return 1
+
+
+def teardown_events_api(state):
+    from app import events_cache
+    from db import connection
+    from events_cache import bump_events_version
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM events WHERE game_id LIKE 'bench-%'")
+        bump_events_version(cur)
+        conn.commit()
+        cur.close()
+    events_cache.invalidate()
+
+
+BENCHMARKS = [
+    Benchmark("ingest.merge_shop", setup_merge_shop, run_merge_shop, None, False, None, None),
+    Benchmark("ingest.upsert_events", setup_upsert, run_upsert, None, True, None, None),
+    Benchmark("staking.decide_bets", synthetic_events, run_decide_bets, None, False, None, None),
+    Benchmark("lexicon.score_articles", article_corpus, run_score_articles, None, False, None, None),
+    Benchmark("lexicon.analyze_sentiment", article_corpus, run_analyze_sentiment, None, False, 10000, None),
+    Benchmark("article_store.score", article_corpus, run_article_store, None, False, 10000, None),
+    Benchmark("api.events_route", setup_events_api, run_events_api, teardown_events_api, True, None, API_REQUESTS),
+]
+
+
+def measure(benchmark, scale, repeat):
+    repeat = benchmark.iterations or repeat
+    state = benchmark.setup(scale)
+    try:
+        benchmark.run(state)  # warm-up: imports and first-touch costs stay out of the timings
+        timings = []
+        items = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            items = benchmark.run(state)
+            timings.append(time.perf_counter() - started)
+        tracemalloc.start()
+        benchmark.run(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        if benchmark.teardown:
+            benchmark.teardown(state)
+    timings = np.array(timings)
+    p50 = float(np.percentile(timings, 50))
+    return {
+        "name": benchmark.name,
+        "scale": scale,
+        "items": items,
+        "iterations": repeat,
+        "p50_ms": p50 * 1000,
+        "p99_ms": float(np.percentile(timings, 99)) * 1000,
+        "throughput_per_s": items / p50 if p50 else None,
+        "peak_mem_mb": peak / 2 ** 20,
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["scale"]): r for r in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get((result["name"], result["scale"]))
+        if before is None:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        print(f"{result['name']} @ {result['scale']}: p50 {before['p50_ms']:.2f} -> {result['p50_ms']:.2f} ms ({change:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backend hot paths on synthetic data.")
+    parser.add_argument("--scales", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run benchmarks whose name contains this")
+    parser.add_argument("--db", action="store_true", help="include benchmarks that need DATABASE_URL")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="PATH", help="earlier results to compare p50 latency against")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",")]
+    results = []
+    for benchmark in BENCHMARKS:
+        if args.only and args.only not in benchmark.name:
+            continue
+        if benchmark.needs_db and not args.db:
+            continue
+        for scale in scales:
+            if benchmark.max_scale and scale > benchmark.max_scale:
+                continue
+            result = measure(benchmark, scale, args.repeat)
+            results.append(result)
+            print(
+                f"{result['name']} @ {scale}: {result['throughput_per_s']:.0f} items/s, "
+                f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, peak {result['peak_mem_mb']:.1f} MB",
+                flush=True,
+            )
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
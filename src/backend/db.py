@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+from metrics import registry, timer
+load_dotenv()
+DB_CONN = os.getenv('DATABASE_URL')
+DB_SSLMODE = os.getenv('DB_SSLMODE', 'require')
+POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Connections idle for longer than this get a "SELECT 1" before being handed out
+HEALTH_CHECK_AFTER = float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30'))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe Postgres connection pool shared by the Flask app and the batch jobs.
+    Callers block (up to `timeout` seconds) for a free slot instead of failing
+    straight away when all `maxconn` connections are checked out. Returned
+    connections stay open for reuse, up to `maxconn` of them; `minconn` are
+    opened up front on first use.
+    """
+
+    def __init__(self, dsn, minconn=POOL_MIN, maxconn=POOL_MAX, timeout=POOL_TIMEOUT,
+                 health_check_after=HEALTH_CHECK_AFTER, **connect_kwargs):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.connect_kwargs = connect_kwargs
+        self._idle = []  # (connection, time it was returned), most recently used last
+        self._warmed = False
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats = {
+            "checkouts": 0,
+            "connects": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "in_use": 0,
+            "in_use_max": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._lock:
+            self._stats["connects"] += 1
+        return conn
+
+    def _warm(self):
+        # Done lazily so importing a module never opens a connection
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+        now = time.monotonic()
+        opened = [(self._connect(), now) for _ in range(self.minconn)]
+        with self._lock:
+            self._idle.extend(opened)
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        if not self._warmed:
+            self._warm()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if self._is_healthy(conn, last_used):
+                return conn
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            conn.close()
+        # Nothing idle: a freshly opened connection needs no health check
+        return self._connect()
+
+    def _checkin(self, conn):
+        if conn.closed:
+            return
+        # Never hand a connection with an open transaction to the next caller
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.maxconn:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        waited = time.monotonic() - started
+        registry.observe("db_pool_wait_seconds", waited, help_text="Time spent waiting for a pooled connection")
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            self._stats["in_use"] += 1
+            self._stats["in_use_max"] = max(self._stats["in_use_max"], self._stats["in_use"])
+        conn = None
+        try:
+            conn = self._checkout()
+            # How long callers hold connections, which is what sizes the pool
+            with timer("db_connection"):
+                yield conn
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["min_size"] = self.minconn
+        stats["max_size"] = self.maxconn
+        stats["idle"] = len(self._idle)
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._warmed = False
+        for conn, _ in idle:
+            conn.close()
+
+
+pool = ConnectionPool(DB_CONN, sslmode=DB_SSLMODE)
+
+
+def _pool_samples():
+    stats = pool.stats()
+    return [
+        ("db_pool_in_use", "Connections checked out of the pool", stats["in_use"], {}),
+        ("db_pool_max_size", "Pool size limit", stats["max_size"], {}),
+        ("db_pool_idle", "Open connections waiting in the pool", stats["idle"], {}),
+        ("db_pool_checkouts", "Connections handed out since start", stats["checkouts"], {}),
+        ("db_pool_connects", "Connections opened since start", stats["connects"], {}),
+        ("db_pool_timeouts", "Checkouts that gave up waiting", stats["timeouts"], {}),
+    ]
+
+
+registry.register_collector(_pool_samples)
+
+
+def connection():
+    """Check a connection out of the shared pool: `with connection() as conn: ...`"""
+    return pool.connection()
+
+
+def pool_stats():
+    return pool.stats()
+
+
+def dedicated_connection():
+    """
+    A connection of its own, outside the pool, for sessions that keep state
+    across transactions (e.g. LISTEN). The caller closes it.
+    """
+    return psycopg2.connect(DB_CONN, sslmode=DB_SSLMODE)
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+import time
+import psycopg2.extras
+from db import connection
+
+EVENT_COLUMNS = "game_id, sport, home_team, away_team, event_time, home_team_odds, away_team_odds"
+# How long a cached version number is trusted before asking Postgres again
+VERSION_CHECK_INTERVAL = float(os.getenv('EVENTS_CACHE_CHECK_INTERVAL', '2'))
+MAX_DELTA_ENTRIES = 32
+
+
+def bump_events_version(cur):
+    """Called by writers inside their transaction; rows they write should carry the returned version."""
+    cur.execute("UPDATE events_version SET version = version + 1 RETURNING version")
+    return cur.fetchone()[0]
+
+
+def events_etag(version, since=None, query=None):
+    if query:
+        # Filtered responses depend only on the version and the query string
+        return f"events-v{version}-q{hashlib.sha1(query).hexdigest()[:16]}"
+    if since is None:
+        return f"events-v{version}"
+    return f"events-v{version}-since{since}"
+
+
+class EventsCache:
+    """
+    In-process cache of the serialized /api/events payload.
+    Entries are keyed on the events_version row, which fetch_h2h bumps on every
+    run, so a stale body is never served once the writer has committed.
+    """
+
+    def __init__(self, dumps, check_interval=VERSION_CHECK_INTERVAL):
+        self.dumps = dumps
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._full = None  # (version, body)
+        self._deltas = {}  # since -> (version, body)
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._checked_at = 0.0
+            self._full = None
+            self._deltas.clear()
+
+    def version(self):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._version
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT version FROM events_version")
+            version = cur.fetchone()[0]
+            cur.close()
+        with self._lock:
+            self._version = version
+            self._checked_at = time.monotonic()
+        return version
+
+    def _load(self, since):
+        with connection() as conn:
+            # Read the version and the rows from the same snapshot so the body
+            # is never tagged with a version older than its contents.
+            conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+            try:
+                cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+                cur.execute("SELECT version FROM events_version")
+                version = cur.fetchone()["version"]
+                if since is None:
+                    cur.execute(f"SELECT {EVENT_COLUMNS} FROM events;")
+                else:
+                    cur.execute(f"SELECT {EVENT_COLUMNS} FROM events WHERE version > %s;", (since,))
+                rows = cur.fetchall()
+                cur.close()
+                conn.rollback()
+            finally:
+                conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT")
+        return version, self.dumps(rows).encode("utf-8")
+
+    def body(self, version, since=None):
+        """Return (version, body) for the full table, or for rows changed after `since`."""
+        with self._lock:
+            entry = self._full if since is None else self._deltas.get(since)
+            if entry is not None and entry[0] >= version:
+                return entry
+        entry = self._load(since)
+        with self._lock:
+            if entry[0] > (self._version or 0):
+                self._version = entry[0]
+                self._checked_at = time.monotonic()
+            if since is None:
+                self._full = entry
+            else:
+                # Deltas from an older version are useless once the version moves on
+                self._deltas = {k: v for k, v in self._deltas.items() if v[0] == entry[0]}
+                if len(self._deltas) >= MAX_DELTA_ENTRIES:
+                    self._deltas.pop(next(iter(self._deltas)))
+                self._deltas[since] = entry
+        return entry
@@ -0,0 +1,143 @@
+import base64
+import json
+from datetime import datetime, timezone
+import psycopg2.extras
+from db import connection
+from events_cache import EVENT_COLUMNS
+
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 2000
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def _parse_time(value, name):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery(f"Invalid {name}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["event_time"].isoformat(), row["game_id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(value):
+    try:
+        event_time, game_id = json.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+        return datetime.fromisoformat(event_time), game_id
+    except (ValueError, TypeError):
+        raise InvalidQuery("Invalid after cursor")
+
+
+def parse_filters(args):
+    """
+    Turn request args into a dict of filters:
+    sport, team, from / to (ISO 8601 bounds on event_time), since (events version),
+    limit and after (opaque keyset cursor returned as X-Next-Cursor).
+    """
+    filters = {}
+    for key in ("sport", "team"):
+        if args.get(key):
+            filters[key] = args[key]
+    if args.get("from"):
+        filters["from"] = _parse_time(args["from"], "from")
+    if args.get("to"):
+        filters["to"] = _parse_time(args["to"], "to")
+    if args.get("since") is not None:
+        try:
+            filters["since"] = int(args["since"])
+        except ValueError:
+            raise InvalidQuery("Invalid since")
+    if args.get("limit") is not None:
+        try:
+            limit = int(args["limit"])
+        except ValueError:
+            raise InvalidQuery("Invalid limit")
+        if limit < 1:
+            raise InvalidQuery("Invalid limit")
+        filters["limit"] = min(limit, MAX_PAGE_SIZE)
+    if args.get("after"):
+        filters["after"] = decode_cursor(args["after"])
+    return filters
+
+
+def _where(filters):
+    clauses, params = [], []
+    if "sport" in filters:
+        clauses.append("sport = %s")
+        params.append(filters["sport"])
+    if "team" in filters:
+        clauses.append("(lower(home_team) = lower(%s) OR lower(away_team) = lower(%s))")
+        params.extend([filters["team"], filters["team"]])
+    if "from" in filters:
+        clauses.append("event_time >= %s")
+        params.append(filters["from"])
+    if "to" in filters:
+        clauses.append("event_time < %s")
+        params.append(filters["to"])
+    if "since" in filters:
+        clauses.append("version > %s")
+        params.append(filters["since"])
+    if "after" in filters:
+        # Row comparison lets Postgres walk the (event_time, game_id) index from the cursor
+        clauses.append("(event_time, game_id) > (%s, %s)")
+        params.extend(filters["after"])
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+
+def fetch_events_page(filters):
+    """Return (rows, next_cursor); next_cursor is None on the last page."""
+    where, params = _where(filters)
+    sql = f"SELECT {EVENT_COLUMNS} FROM events{where} ORDER BY event_time, game_id"
+    limit = filters.get("limit")
+    if limit is not None:
+        # Fetch one extra row to know whether another page exists
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+    with connection() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def stream_events(filters, dumps, fmt="json"):
+    """
+    Yield the matching rows as JSON array or NDJSON chunks, reading them through
+    a server-side cursor so only one batch is held in memory at a time.
+    """
+    where, params = _where(filters)
+    sql = f"SELECT {EVENT_COLUMNS} FROM events{where} ORDER BY event_time, game_id"
+    with connection() as conn:
+        cur = conn.cursor(name="events_export", cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.itersize = EXPORT_BATCH_SIZE
+        cur.execute(sql, params)
+        if fmt == "json":
+            yield "["
+        first = True
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            if fmt == "ndjson":
+                yield "".join(dumps(row) + "\n" for row in rows)
+            else:
+                chunk = ",".join(dumps(row) for row in rows)
+                yield chunk if first else "," + chunk
+            first = False
+        if fmt == "json":
+            yield "]"
+        cur.close()
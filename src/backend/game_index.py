@@ -0,0 +1,88 @@
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from teams import TEAM_ALIASES
+
+# Two listings of a game match when they start within this long of each other.
+# Games are bucketed by start time at the same width, so a lookup only ever
+# looks at its own bucket and the two next to it.
+TOLERANCE = timedelta(hours=6)
+
+
+def normalize_name(name):
+    """Lowercase, accents and punctuation stripped, whitespace collapsed."""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^\w\s]", " ", name.lower())
+    return " ".join(name.split())
+
+
+def alias_table(aliases=TEAM_ALIASES):
+    """{normalized alias or name: normalized canonical name}."""
+    table = {}
+    for team, names in aliases.items():
+        canonical = normalize_name(team)
+        table[canonical] = canonical
+        for alias in names:
+            table.setdefault(normalize_name(alias), canonical)
+    return table
+
+
+def parse_time(value):
+    """Accept a datetime or the API's ISO 8601 strings ("2024-03-01T19:00:00Z")."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class GameIndex:
+    """
+    Finds a game from its teams and start time when the provider's game id
+    isn't available. Games are keyed by canonical team names (normalized, with
+    aliases from teams.py folded in) and a start-time bucket, so each lookup
+    costs a few dict probes however many games are indexed. A game listed
+    with home and away swapped still matches.
+    """
+
+    def __init__(self, games=(), tolerance=TOLERANCE, aliases=TEAM_ALIASES):
+        self.tolerance = tolerance
+        self._aliases = alias_table(aliases)
+        self._buckets = {}
+        for game in games:
+            self.add(game)
+
+    def canonical(self, team):
+        name = normalize_name(team)
+        return self._aliases.get(name, name)
+
+    def _bucket(self, moment):
+        return int(moment.timestamp() // self.tolerance.total_seconds())
+
+    def add(self, game):
+        """Index a game dict with home_team, away_team and commence_time."""
+        moment = parse_time(game["commence_time"])
+        key = (self.canonical(game["home_team"]), self.canonical(game["away_team"]), self._bucket(moment))
+        self._buckets.setdefault(key, []).append((moment, game))
+
+    def find(self, home_team, away_team, commence_time, sport=None):
+        """
+        The indexed game closest in start time to the one described, or None.
+        With `sport`, games listed under another sport_key are passed over.
+        """
+        moment = parse_time(commence_time)
+        home, away = self.canonical(home_team), self.canonical(away_team)
+        bucket = self._bucket(moment)
+        best, best_gap = None, self.tolerance
+        for teams in ((home, away), (away, home)):
+            for b in (bucket - 1, bucket, bucket + 1):
+                for candidate_time, game in self._buckets.get((*teams, b), ()):
+                    if sport and game.get("sport_key") and game["sport_key"] != sport:
+                        continue
+                    gap = abs(candidate_time - moment)
+                    if gap < best_gap or (best is None and gap == best_gap):
+                        best, best_gap = game, gap
+        return best
+
+    def __len__(self):
+        return sum(len(games) for games in self._buckets.values())
@@ -1,102 +1,81 @@
-import requests
-from dotenv import load_dotenv
-import os
-from datetime import datetime
-import psycopg2
-import pytz
-load_dotenv()
-APIKEY = os.getenv('API_KEY')
-SPORT = "upcoming"
-MARKETS = "h2h"
-ODDS_FORMAT = "decimal"
-DATE_FORMAT = "iso"
-DB_CONN = os.getenv('DATABASE_URL')
-now_utc = datetime.now(pytz.utc)
-hour_utc = now_utc.hour
+from datetime import datetime, timezone
+from db import connection
+from events_cache import bump_events_version
+from ingest import upsert_events
+from line_shopping import shop_lines
+from metrics import span
+from odds_history import record_snapshots
+from odds_fetcher import fetch_odds
+from schema import ensure_schema
 
 
-if hour_utc >= 22 or hour_utc < 5:
-    best_region = "us"
-elif 17 <= hour_utc < 22:
-    best_region = "eu"
-elif 5 <= hour_utc < 12:
-    best_region = "au"
-else:
-    best_region = "us"
+# Pull odds for every configured sport key and region (ODDS_SPORT_KEYS / ODDS_REGIONS)
+# concurrently, keep the best h2h price per team and upsert the events table.
+# Every quoted price is also appended to the odds history for line movement.
+@span("fetch_h2h")
+def fetch_h2h(sports=None, regions=None):
+    fetched_at = datetime.now(timezone.utc)
+    odds_json = fetch_odds(sports, regions)
+    if not odds_json:
+        print("No odds fetched.")
+        return
+    rows = []
+    # Best price per team across every bookmaker, computed for the whole payload at once
+    lines = shop_lines(odds_json, "h2h")
+    for event, line in zip(odds_json, lines):
+        sport_name = event.get("sport_title", "Unknown Sport")  # Get sport name from API
+        event_time = event["commence_time"]
+        game_id = event.get("id", None)
 
-def cur_region():
-    return best_region
+        # Extract team names and odds
+        home_team = event["home_team"]
+        away_team = event["away_team"]
+        home_team_odds, home_team_bookmaker = line["best"].get(home_team, (None, "Unknown Bookmaker"))
+        away_team_odds, away_team_bookmaker = line["best"].get(away_team, (None, "Unknown Bookmaker"))
+        if line["arb_margin"] is not None and line["arb_margin"] > 0:
+            print(f"Arbitrage on {home_team} vs {away_team}: margin {line['arb_margin']:.2%}")
 
+        rows.append((
+            game_id,
+            sport_name,
+            home_team,
+            away_team,
+            home_team_odds,
+            away_team_odds,
+            event_time,
+            home_team_bookmaker,
+            away_team_bookmaker,
+        ))
 
-# Execute the query to list all tables in the public schema
-def fetch_h2h():
-    conn = psycopg2.connect(DB_CONN, sslmode='require')
-    cur = conn.cursor()
-    odds_response = requests.get(
-        f"https://api.the-odds-api.com/v4/sports/{SPORT}/odds",
-        params={
-            "api_key": APIKEY,
-            "regions": best_region,
-            "markets": MARKETS,
-            "oddsFormat": ODDS_FORMAT,
-            "dateFormat": DATE_FORMAT,
-        },
+    # Upsert into NeonDB in one batch, keyed on game_id
+    ensure_schema()
+    with connection() as conn:
+        cur = conn.cursor()
+        # Every row written in this run is tagged with the new version; the API
+        # uses it to invalidate its cached /api/events body and to serve ?since= deltas.
+        version = bump_events_version(cur)
+        counts = upsert_events(cur, rows, version)
+        if counts["inserted"] or counts["updated"]:
+            conn.commit()
+        else:
+            # Nothing changed, so keep the old version and the API caches warm
+            conn.rollback()
+        cur.close()
+    print(
+        f"Events upsert: {counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged, {counts['skipped']} skipped (no game_id)"
     )
-    if odds_response.status_code != 200:
-        print(f"Error fetching odds: {odds_response.status_code}, {odds_response.text}")
-    else:
-        odds_json = odds_response.json()
-        for event in odds_json:
-            best_odds = {}  # Track the best odds for each team
-            best_bookmaker = {}  # Track which bookmaker offers the best odds
-            sport_name = event.get("sport_title", "Unknown Sport")  # Get sport name from API
-            event_time = event["commence_time"]
-            game_id = event.get("id", None)
-
-            for bookmaker in event["bookmakers"]:
-                for market in bookmaker["markets"]:
-                    if market["key"] == "h2h":  # Ensure it's a head-to-head market
-                        for outcome in market["outcomes"]:
-                            team = outcome["name"]
-                            price = outcome["price"]
-
-                            # Update best odds if this bookmaker offers better odds
-                            if team not in best_odds or price > best_odds[team]:
-                                best_odds[team] = price
-                                best_bookmaker[team] = bookmaker["title"]
-
-            # Extract team names and odds
-            home_team = event["home_team"]
-            away_team = event["away_team"]
-            home_team_odds = best_odds.get(home_team)
-            away_team_odds = best_odds.get(away_team)
-            home_team_bookmaker = best_bookmaker.get(home_team, "Unknown Bookmaker")
-            away_team_bookmaker = best_bookmaker.get(away_team, "Unknown Bookmaker")
-
-            # Insert into NeonDB
-            cur.execute(
-                """
-                INSERT INTO events (game_id, sport, home_team, away_team, home_team_odds, away_team_odds, event_time, home_team_bookmaker, away_team_bookmaker)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    game_id,
-                    sport_name,
-                    home_team,
-                    away_team,
-                    home_team_odds,
-                    away_team_odds,
-                    event_time,
-                    home_team_bookmaker,
-                    away_team_bookmaker,
-                ),
-            )
 
-        # Commit and close
+    # Separate transaction: history is kept even when the events table didn't change
+    with connection() as conn:
+        cur = conn.cursor()
+        counts["snapshots"] = record_snapshots(cur, odds_json, fetched_at)
         conn.commit()
         cur.close()
-        conn.close()
+    print(f"Odds history: {counts['snapshots']} snapshots recorded.")
+    return counts
 
-fetch_h2h()
+if __name__ == "__main__":
+    fetch_h2h()
 
 
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+CACHE_PATH = os.getenv('SCRAPE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "http_cache.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv('SCRAPE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+DEFAULT_TTL = float(os.getenv('SCRAPE_CACHE_TTL', '600'))
+# Per-host overrides, e.g. "www.espn.com=300,www.bbc.com=1800"
+HOST_TTLS = {
+    host.strip(): float(ttl)
+    for host, ttl in (item.split("=", 1) for item in os.getenv('SCRAPE_CACHE_HOST_TTLS', '').split(",") if "=" in item)
+}
+
+
+class HttpCache:
+    """
+    Persistent, size-bounded HTTP response cache for the scraper, stored in SQLite.
+    Entries keep the validators (ETag / Last-Modified) needed for conditional
+    requests and, for articles, the extracted text so an unchanged article never
+    has to be parsed again. Least recently used entries are evicted once the
+    stored bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, default_ttl=DEFAULT_TTL, host_ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.host_ttls = HOST_TTLS if host_ttls is None else host_ttls
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                text TEXT
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access_idx ON responses (last_access)")
+        self._db.commit()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "evictions": 0}
+
+    def count(self, kind):
+        with self._lock:
+            self.stats[kind] += 1
+
+    def ttl_for(self, url):
+        return self.host_ttls.get(urlsplit(url).netloc, self.default_ttl)
+
+    def get(self, url):
+        """Return the cached entry as a dict (with "fresh" set) or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, expires_at, body, text FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self._db.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+            self._db.commit()
+        etag, last_modified, expires_at, body, text = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": expires_at > now,
+            "body": zlib.decompress(body).decode("utf-8"),
+            "text": text,
+        }
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, body, headers, ttl=None):
+        ttl = self.ttl_for(url) if ttl is None else ttl
+        now = time.time()
+        compressed = zlib.compress(body.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO responses (url, etag, last_modified, expires_at, last_access, size, body, text)
+                VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+                """,
+                (url, headers.get("ETag"), headers.get("Last-Modified"), now + ttl, now, len(compressed), compressed),
+            )
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url, headers=None, ttl=None):
+        """Extend an entry after a 304, picking up any new validators."""
+        ttl = self.ttl_for(url) if ttl is None else ttl
+        headers = headers or {}
+        with self._lock:
+            self._db.execute(
+                """
+                UPDATE responses
+                SET expires_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                WHERE url = ?
+                """,
+                (time.time() + ttl, headers.get("ETag"), headers.get("Last-Modified"), url),
+            )
+            self._db.commit()
+
+    def set_text(self, url, text):
+        with self._lock:
+            self._db.execute("UPDATE responses SET text = ?, size = size + ? WHERE url = ?", (text, len(text.encode("utf-8")), url))
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self._db.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.stats["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self._lock:
+            self._db.close()
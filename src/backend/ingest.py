@@ -0,0 +1,77 @@
+import csv
+import io
+
+# Column order of the rows handed to upsert_events
+EVENT_FIELDS = (
+    "game_id",
+    "sport",
+    "home_team",
+    "away_team",
+    "home_team_odds",
+    "away_team_odds",
+    "event_time",
+    "home_team_bookmaker",
+    "away_team_bookmaker",
+)
+
+# Columns that count as "changed" for an existing game_id; anything else is left alone
+CHANGE_FIELDS = ("home_team_odds", "away_team_odds", "event_time", "home_team_bookmaker", "away_team_bookmaker")
+
+
+def upsert_events(cur, rows, version):
+    """
+    Load `rows` (tuples in EVENT_FIELDS order) into events in two round trips:
+    COPY into a temporary staging table, then one INSERT ... ON CONFLICT (game_id)
+    that only rewrites rows whose odds, start time or bookmakers differ.
+    Must run inside the caller's transaction. Returns inserted/updated/unchanged counts.
+    """
+    columns = ", ".join(EVENT_FIELDS)
+    cur.execute(f"CREATE TEMP TABLE events_staging ON COMMIT DROP AS SELECT {columns} FROM events WITH NO DATA")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    skipped = 0
+    for row in rows:
+        if row[0] is None:
+            # Without a game_id there is nothing to key the upsert on
+            skipped += 1
+            continue
+        writer.writerow(row)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY events_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    updates = ", ".join(f"{field} = EXCLUDED.{field}" for field in CHANGE_FIELDS)
+    current = ", ".join(f"events.{field}" for field in CHANGE_FIELDS)
+    incoming = ", ".join(f"EXCLUDED.{field}" for field in CHANGE_FIELDS)
+    cur.execute(
+        f"""
+        WITH src AS (
+            -- The same game can show up more than once per run (e.g. across regions)
+            SELECT DISTINCT ON (game_id) {columns}
+            FROM events_staging
+            ORDER BY game_id
+        ),
+        upserted AS (
+            INSERT INTO events ({columns}, version)
+            SELECT {columns}, %s FROM src
+            ON CONFLICT (game_id) DO UPDATE
+            SET {updates}, version = EXCLUDED.version
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            (SELECT count(*) FROM src),
+            count(*) FILTER (WHERE inserted),
+            count(*) FILTER (WHERE NOT inserted)
+        FROM upserted
+        """,
+        (version,),
+    )
+    total, inserted, updated = cur.fetchone()
+    cur.execute("DROP TABLE events_staging")
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": total - inserted - updated,
+        "skipped": skipped,
+    }
@@ -0,0 +1,90 @@
+import psycopg2
+from psycopg2 import errorcodes
+
+
+class LedgerError(Exception):
+    pass
+
+
+class UnknownProfile(LedgerError):
+    pass
+
+
+class InsufficientBalance(LedgerError):
+    pass
+
+
+# Debit and investment row in one statement. The UPDATE locks the profile row,
+# and a concurrent invest for the same profile waits for it and then re-checks
+# `balance >= amount` against the committed balance, so two requests can never
+# both spend the same money. No debit, no investment row: the INSERT reads
+# from the UPDATE's output.
+INVEST_SQL = """
+    WITH debit AS (
+        UPDATE profiles
+        SET balance = balance - %(amount)s,
+            money_in = money_in + %(amount)s
+        WHERE auth0_id = %(auth0_id)s
+          AND balance >= %(amount)s
+        RETURNING balance + %(amount)s AS starting_balance
+    )
+    INSERT INTO investments (auth0_id, amount, start_date, starting_balance, idempotency_key)
+    SELECT %(auth0_id)s, %(amount)s, NOW(), starting_balance, %(idempotency_key)s
+    FROM debit
+    RETURNING id
+"""
+
+
+def _existing(cur, auth0_id, idempotency_key):
+    if idempotency_key is None:
+        return None
+    cur.execute(
+        "SELECT id FROM investments WHERE auth0_id = %s AND idempotency_key = %s",
+        (auth0_id, idempotency_key),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def invest(conn, auth0_id, amount, idempotency_key=None):
+    """
+    Move `amount` from the profile's balance into a new investment and commit.
+    Returns (investment_id, replayed). A retry carrying an idempotency key the
+    profile has already used gets the original investment back with
+    replayed=True instead of a second debit. Raises UnknownProfile or
+    InsufficientBalance (after rolling back) when nothing can be debited.
+    """
+    cur = conn.cursor()
+    try:
+        investment_id = _existing(cur, auth0_id, idempotency_key)
+        if investment_id is not None:
+            conn.commit()
+            return investment_id, True
+        params = {"auth0_id": auth0_id, "amount": amount, "idempotency_key": idempotency_key}
+        try:
+            cur.execute(INVEST_SQL, params)
+        except psycopg2.IntegrityError as e:
+            # A concurrent request with the same key committed first
+            conn.rollback()
+            if e.pgcode != errorcodes.UNIQUE_VIOLATION:
+                raise
+            investment_id = _existing(cur, auth0_id, idempotency_key)
+            if investment_id is None:
+                raise
+            conn.commit()
+            return investment_id, True
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("SELECT balance FROM profiles WHERE auth0_id = %s", (auth0_id,))
+            profile = cur.fetchone()
+            conn.rollback()
+            if profile is None:
+                raise UnknownProfile("Unknown profile")
+            raise InsufficientBalance("Insufficient balance")
+        conn.commit()
+        return row[0], False
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,125 @@
+import re
+from itertools import chain, repeat
+import numpy as np
+
+sentiment_lexicon = {
+    "good": 1.0,
+    "great": 2.0,
+    "excellent": 3.0,
+    "positive": 1.0,
+    "fortunate": 1.5,
+    "superior": 1.5,
+    "happy": 1.5,
+    "joy": 2.0,
+    "love": 2.0,
+    "successful": 2.0,
+    "efficient": 1.5,
+    "improved": 1.5,
+    "enhanced": 1.5,
+    "boost": 1.5,
+    "bad": -1.0,
+    "terrible": -2.5,
+    "awful": -3.0,
+    "negative": -1.0,
+    "unfortunate": -1.5,
+    "inferior": -1.5,
+    "sad": -1.5,
+    "angry": -2.0,
+    "hate": -2.0,
+    "disappointing": -2.0,
+    "mediocre": -0.5,
+    "underperformed": -2.0,
+    "declined": -1.5,
+    "ruined": -2.5,
+    "win": 2.0,
+    "victory": 2.5,
+    "defeat": -2.5,
+    "conquered": 2.5,
+    "dominated": 2.5,
+    "clutch": 2.0,
+    "heroic": 2.5,
+    "unstoppable": 2.5,
+    "rallied": 1.5,
+    "excelled": 2.0,
+    "faltering": -1.5,
+    "struggling": -1.5,
+    "resilient": 1.5,
+    "dominant": 2.0,
+    "impressive": 2.0,
+    "spectacular": 3.0,
+    "thrilling": 2.0,
+    "incredible": 2.5,
+    "phenomenal": 3.0,
+    "unimpressive": -1.5,
+    "pathetic": -2.0,
+    "embarrassing": -2.5,
+    "disastrous": -3.0,
+    "soared": 2.0,
+    "plummeted": -2.5,
+    "rising": 1.5,
+    "falling": -1.5,
+    "racing": 1.0,
+    "dominance": 2.0,
+    "momentum": 1.5,
+    "strategy": 0.5,
+    "tactics": 0.5,
+    "pressured": -1.0,
+    "clamped": -0.5,
+    "outplayed": -1.5,
+    "unleashed": 1.5,
+    "compromised": -1.5,
+    "disintegrated": -3.0,
+    "overwhelmed": -1.5,
+}
+negation_words = {"not", "no", "never", "none", "nobody", "nothing", "neither", "nor", "nowhere", "hardly", "scarcely", "barely", "dont", "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "cannot", "cant", "couldnt", "shouldnt", "wont"}
+
+# Same cleanup as the original preprocess_text: lowercase, drop punctuation, split on whitespace
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+# Token ids: 0 = not in the lexicon, 1..N = lexicon words, N+1.. = negation words
+_LEXICON_WORDS = list(sentiment_lexicon)
+_VOCAB = {word: i + 1 for i, word in enumerate(_LEXICON_WORDS)}
+_NEGATION_START = len(_VOCAB) + 1
+_VOCAB.update({word: _NEGATION_START + i for i, word in enumerate(sorted(negation_words))})
+_SCORES = np.zeros(len(_VOCAB) + 1)
+_SCORES[1:_NEGATION_START] = [sentiment_lexicon[word] for word in _LEXICON_WORDS]
+
+
+def preprocess_text(text):
+    return _PUNCTUATION.sub('', text.lower())
+
+
+def tokenize(text):
+    return preprocess_text(text).split()
+
+
+def score_articles(texts):
+    """
+    Lexicon sentiment for a batch of articles in one vectorized pass.
+    A negation word directly before a lexicon word flips that word's score
+    (and the word is not counted again), exactly like the old per-word loop.
+    Returns a float array with one score per text.
+    """
+    tokenized = [tokenize(text) for text in texts]
+    lengths = np.fromiter((len(tokens) for tokens in tokenized), dtype=np.int64, count=len(tokenized))
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(len(texts))
+    ids = np.fromiter(
+        map(_VOCAB.get, chain.from_iterable(tokenized), repeat(0)), dtype=np.int64, count=total
+    )
+    doc = np.repeat(np.arange(len(texts)), lengths)
+
+    scores = _SCORES[ids]
+    # A negation applies when the next token is a lexicon word in the same article
+    negates = np.zeros(total, dtype=bool)
+    in_lexicon = (ids > 0) & (ids < _NEGATION_START)
+    negates[:-1] = (ids[:-1] >= _NEGATION_START) & in_lexicon[1:] & (doc[:-1] == doc[1:])
+    flipped = np.zeros(total, dtype=bool)
+    flipped[1:] = negates[:-1]
+    contribution = np.where(flipped, -scores, scores)
+    return np.bincount(doc, weights=contribution, minlength=len(texts))
+
+
+def analyze_sentiment(text):
+    return float(score_articles([text])[0])
@@ -0,0 +1,130 @@
+import math
+import numpy as np
+
+
+def flatten_odds(events, market="h2h"):
+    """
+    Flatten an Odds API payload into columnar arrays, one entry per quoted price.
+    A "selection" is one outcome of one event (e.g. the home team in game X);
+    `selection_event` / `selection_name` map selection ids back to the payload.
+    """
+    selection_col, bookmaker_col, price_col = [], [], []
+    selection_event, selection_name = [], []
+    bookmaker_ids = {}
+    bookmaker_names = []
+    # Bound methods keep the per-price work down to three appends
+    add_selection, add_bookmaker, add_price = selection_col.append, bookmaker_col.append, price_col.append
+
+    for event_pos, event in enumerate(events):
+        names = {}  # outcome name -> selection id, for this event only
+        for bookmaker in event.get("bookmakers", ()):
+            title = bookmaker["title"]
+            bookmaker_id = bookmaker_ids.get(title)
+            if bookmaker_id is None:
+                bookmaker_id = bookmaker_ids[title] = len(bookmaker_names)
+                bookmaker_names.append(title)
+            for m in bookmaker["markets"]:
+                if m["key"] != market:
+                    continue
+                for outcome in m["outcomes"]:
+                    name = outcome["name"]
+                    selection_id = names.get(name)
+                    if selection_id is None:
+                        selection_id = names[name] = len(selection_name)
+                        selection_event.append(event_pos)
+                        selection_name.append(name)
+                    add_selection(selection_id)
+                    add_bookmaker(bookmaker_id)
+                    add_price(outcome["price"])
+
+    selection = np.asarray(selection_col, dtype=np.int64)
+    selection_event = np.asarray(selection_event, dtype=np.int64)
+    return {
+        "n_events": len(events),
+        "selection": selection,
+        "event": selection_event[selection] if len(selection) else np.empty(0, dtype=np.int64),
+        "bookmaker": np.asarray(bookmaker_col, dtype=np.int64),
+        "price": np.asarray(price_col, dtype=np.float64),
+        "selection_event": selection_event,
+        "selection_name": selection_name,
+        "bookmaker_names": bookmaker_names,
+    }
+
+
+def compute_lines(table):
+    """
+    Per selection: best and second-best price, the bookmaker offering the best
+    price and the consensus no-vig probability (each bookmaker's implied
+    probabilities normalised by its own overround, averaged across bookmakers).
+    Per event: arbitrage margin, 1 - sum(1 / best price); positive means an arb.
+    """
+    n_selections = len(table["selection_name"])
+    selection = table["selection"]
+    price = table["price"]
+    n_events = table["n_events"]
+    best_price = np.full(n_selections, np.nan)
+    second_price = np.full(n_selections, np.nan)
+    best_bookmaker = np.full(n_selections, -1, dtype=np.int64)
+    no_vig = np.full(n_selections, np.nan)
+    arb_margin = np.full(n_events, np.nan)
+    if not len(price):
+        return {"best_price": best_price, "second_price": second_price, "best_bookmaker": best_bookmaker,
+                "no_vig": no_vig, "arb_margin": arb_margin}
+
+    # Sort by selection, then price descending; the stable sort keeps the first
+    # bookmaker seen on ties, like the original loop did.
+    order = np.lexsort((-price, selection))
+    sorted_selection = selection[order]
+    first = np.empty(len(order), dtype=bool)
+    first[0] = True
+    first[1:] = sorted_selection[1:] != sorted_selection[:-1]
+    first_pos = np.flatnonzero(first)
+    best_price[sorted_selection[first_pos]] = price[order[first_pos]]
+    best_bookmaker[sorted_selection[first_pos]] = table["bookmaker"][order[first_pos]]
+    next_pos = first_pos + 1
+    has_second = next_pos < len(order)
+    has_second[has_second] = sorted_selection[next_pos[has_second]] == sorted_selection[first_pos[has_second]]
+    second_price[sorted_selection[first_pos[has_second]]] = price[order[next_pos[has_second]]]
+
+    # No-vig: normalise each (event, bookmaker) book to sum to 1, then average per selection
+    implied = 1.0 / price
+    book = table["event"] * len(table["bookmaker_names"]) + table["bookmaker"]
+    _, book_id = np.unique(book, return_inverse=True)
+    book_total = np.bincount(book_id, weights=implied)
+    fair = implied / book_total[book_id]
+    quotes = np.bincount(selection, minlength=n_selections)
+    no_vig = np.bincount(selection, weights=fair, minlength=n_selections) / np.maximum(quotes, 1)
+    no_vig[quotes == 0] = np.nan
+
+    selection_event = table["selection_event"]
+    best_total = np.bincount(selection_event, weights=1.0 / best_price, minlength=n_events)
+    priced = np.bincount(selection_event, minlength=n_events) > 0
+    arb_margin[priced] = 1.0 - best_total[priced]
+    return {"best_price": best_price, "second_price": second_price, "best_bookmaker": best_bookmaker,
+            "no_vig": no_vig, "arb_margin": arb_margin}
+
+
+def shop_lines(events, market="h2h"):
+    """
+    Line-shop a payload in one vectorized pass. Returns one dict per event:
+    {"best": {team: (price, bookmaker)}, "second_best": {team: price},
+     "no_vig": {team: probability}, "arb_margin": float or None}
+    """
+    table = flatten_odds(events, market)
+    lines = compute_lines(table)
+    results = [{"best": {}, "second_best": {}, "no_vig": {}, "arb_margin": None} for _ in events]
+    bookmaker_names = table["bookmaker_names"]
+    best_price = lines["best_price"].tolist()
+    second_price = lines["second_price"].tolist()
+    best_bookmaker = lines["best_bookmaker"].tolist()
+    no_vig = lines["no_vig"].tolist()
+    for selection_id, (event_pos, name) in enumerate(zip(table["selection_event"].tolist(), table["selection_name"])):
+        result = results[event_pos]
+        result["best"][name] = (best_price[selection_id], bookmaker_names[best_bookmaker[selection_id]])
+        if not math.isnan(second_price[selection_id]):
+            result["second_best"][name] = second_price[selection_id]
+        result["no_vig"][name] = no_vig[selection_id]
+    for event_pos, margin in enumerate(lines["arb_margin"].tolist()):
+        if not math.isnan(margin):
+            results[event_pos]["arb_margin"] = margin
+    return results
@@ -0,0 +1,77 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from teams import TEAM_ALIASES, team_names
+
+
+class AnchorExtractor(HTMLParser):
+    """
+    Streaming extractor for (href, text) pairs. Unlike a full BeautifulSoup
+    tree it keeps nothing but the anchors, so a front page is one linear pass.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors = []
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._href = dict(attrs).get("href")
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href is not None:
+            self.anchors.append((self._href, " ".join("".join(self._text).split())))
+            self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+
+def extract_anchors(html):
+    parser = AnchorExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.anchors
+
+
+class TeamMatcher:
+    """
+    One compiled, case-insensitive alternation over every team name and alias
+    in a run, so each anchor text is scanned once no matter how many teams
+    there are. Names only match on word boundaries ("Heat" not in "Heathrow").
+    """
+
+    def __init__(self, teams, aliases=TEAM_ALIASES):
+        self._owners = {}
+        for team in teams:
+            for name in team_names(team, aliases):
+                self._owners.setdefault(name.lower(), set()).add(team)
+        # Longest names first so "Los Angeles Lakers" wins over "Lakers"
+        names = sorted(self._owners, key=len, reverse=True)
+        if names:
+            alternation = "|".join(re.escape(name) for name in names)
+            self._pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    def teams_in(self, text):
+        if self._pattern is None:
+            return set()
+        found = set()
+        for match in self._pattern.finditer(text):
+            found |= self._owners[match.group(0).lower()]
+        return found
+
+    def match_links(self, html, base_url):
+        """Map each team to the absolute links on the page whose anchor text mentions it."""
+        matches = {}
+        for href, text in extract_anchors(html):
+            if not href or not text:
+                continue
+            for team in self.teams_in(text):
+                matches.setdefault(team, []).append(urljoin(base_url, href))
+        return matches
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Load test for /api/invest against the database in DATABASE_URL (use a local
+Postgres, never production). Creates throwaway profiles, fires concurrent
+invests at them through the Flask app, some with retried idempotency keys,
+then checks the ledger invariants and reports throughput and latency.
+
+    python load_test_invest.py --requests 5000 --threads 64 --profiles 20
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+import concurrent.futures
+from db import connection
+from schema import ensure_schema
+from app import app
+
+PROFILE_PREFIX = "loadtest-"
+
+
+def setup_profiles(count, balance):
+    run = uuid.uuid4().hex[:8]
+    ids = [f"{PROFILE_PREFIX}{run}-{i}" for i in range(count)]
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO profiles (auth0_id, balance, money_in) VALUES (%s, %s, 0)",
+            [(auth0_id, balance) for auth0_id in ids],
+        )
+        conn.commit()
+        cur.close()
+    return ids
+
+
+def cleanup(ids):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM investments WHERE auth0_id = ANY(%s)", (ids,))
+        cur.execute("DELETE FROM profiles WHERE auth0_id = ANY(%s)", (ids,))
+        conn.commit()
+        cur.close()
+
+
+def check_invariants(ids, balance, accepted):
+    """Return a list of violated invariants (empty when the ledger is consistent)."""
+    failures = []
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT p.auth0_id, p.balance, p.money_in,
+                   COALESCE(SUM(i.amount), 0), COUNT(i.id), COUNT(DISTINCT i.idempotency_key)
+            FROM profiles p
+            LEFT JOIN investments i ON i.auth0_id = p.auth0_id
+            WHERE p.auth0_id = ANY(%s)
+            GROUP BY p.auth0_id, p.balance, p.money_in
+            """,
+            (ids,),
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        cur.close()
+    total = 0
+    for auth0_id, current, money_in, invested, count, keys in rows:
+        total += count
+        if current < 0:
+            failures.append(f"{auth0_id}: negative balance {current}")
+        if abs(float(current) + float(invested) - balance) > 1e-6:
+            failures.append(f"{auth0_id}: balance {current} + invested {invested} != {balance}")
+        if abs(float(money_in) - float(invested)) > 1e-6:
+            failures.append(f"{auth0_id}: money_in {money_in} != invested {invested}")
+        if keys != count:
+            failures.append(f"{auth0_id}: {count} investments for {keys} idempotency keys")
+    if total != len(accepted):
+        failures.append(f"{total} investment rows for {len(accepted)} accepted requests")
+    return failures
+
+
+def run(requests, threads, profiles, balance, amount, retry_rate):
+    ensure_schema()
+    ids = setup_profiles(profiles, balance)
+    # Some keys are sent twice to stand in for client retries
+    plan = []
+    for _ in range(requests):
+        key = uuid.uuid4().hex
+        auth0_id = random.choice(ids)
+        plan.append((auth0_id, key))
+        if random.random() < retry_rate:
+            plan.append((auth0_id, key))
+    random.shuffle(plan)
+
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+    accepted = set()
+
+    def fire(auth0_id, key):
+        started = time.perf_counter()
+        response = app.test_client().post(
+            "/api/invest",
+            json={"auth0_id": auth0_id, "amount": amount},
+            headers={"Idempotency-Key": key},
+        )
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                accepted.add(response.get_json()["investment_id"])
+
+    try:
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [executor.submit(fire, *call) for call in plan]:
+                future.result()
+        wall = time.perf_counter() - started
+        failures = check_invariants(ids, balance, accepted)
+    finally:
+        cleanup(ids)
+
+    latencies.sort()
+    print(f"{len(plan)} requests ({len(plan) - requests} retries) on {threads} threads in {wall:.2f}s: "
+          f"{len(plan) / wall:.0f} req/s")
+    print(f"Latency p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    print("Status codes: " + ", ".join(f"{code}: {n}" for code, n in sorted(statuses.items())))
+    for failure in failures:
+        print(f"INVARIANT VIOLATED: {failure}")
+    if not failures:
+        print("Ledger invariants hold.")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--profiles", type=int, default=10)
+    parser.add_argument("--balance", type=float, default=1000)
+    parser.add_argument("--amount", type=float, default=7)
+    parser.add_argument("--retry-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    ok = run(args.requests, args.threads, args.profiles, args.balance, args.amount, args.retry_rate)
+    sys.exit(0 if ok else 1)
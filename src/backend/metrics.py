@@ -0,0 +1,159 @@
+import atexit
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Wide enough for both API requests (milliseconds) and batch jobs (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# Batch jobs run in their own process; set this to have them write their
+# metrics on exit for node_exporter's textfile collector
+TEXTFILE = os.getenv('METRICS_TEXTFILE')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    return name, [(k, str(v)) for k, v in labels]
+
+
+class Registry:
+    """
+    Minimal in-process Prometheus registry: counters, gauges and histograms
+    keyed by name and label set, rendered in the text exposition format.
+    Collectors are callables returning gauge samples computed at scrape time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def _describe(self, name, kind, help_text):
+        self._help.setdefault(name, (kind, help_text))
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._describe(name, "counter", help_text)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._describe(name, "gauge", help_text)
+            self._gauges[key] = value
+
+    def observe(self, name, value, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._describe(name, "histogram", help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def register_collector(self, collector):
+        """`collector()` returns [(name, help, value, labels_dict), ...] gauge samples."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        gauges = {}
+        for collector in list(self._collectors):
+            try:
+                for name, help_text, value, labels in collector():
+                    if value is None:
+                        continue
+                    self._describe(name, "gauge", help_text)
+                    gauges[(name, tuple(sorted(labels.items())))] = value
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+
+        with self._lock:
+            gauges = {**self._gauges, **gauges}
+            samples = {}
+            for (name, labels), value in sorted(self._counters.items(), key=_sort_key):
+                samples.setdefault(name, []).append(f"{name}{_label_text(labels)} {_number(value)}")
+            for (name, labels), value in sorted(gauges.items(), key=_sort_key):
+                samples.setdefault(name, []).append(f"{name}{_label_text(labels)} {_number(value)}")
+            for (name, labels), histogram in sorted(self._histograms.items(), key=_sort_key):
+                lines = samples.setdefault(name, [])
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{_label_text(labels)} {_number(histogram['sum'])}")
+                lines.append(f"{name}_count{_label_text(labels)} {histogram['count']}")
+            out = []
+            for name in sorted(samples):
+                kind, help_text = self._help[name]
+                out.append(f"# HELP {name} {help_text or name}")
+                out.append(f"# TYPE {name} {kind}")
+                out.extend(samples[name])
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Time the block into the `<name>_seconds` histogram; exceptions also count
+    towards `<name>_errors_total` and are re-raised.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc(f"{name}_errors_total", help_text=f"Failed {name} calls", **labels)
+        raise
+    finally:
+        registry.observe(f"{name}_seconds", time.perf_counter() - started, help_text=f"Duration of {name}", **labels)
+
+
+def span(name, **labels):
+    """Decorator form of timer()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def write_textfile(path):
+    # Written to a temporary file and renamed, so the collector never reads half a file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+if TEXTFILE:
+    atexit.register(write_textfile, TEXTFILE)
@@ -0,0 +1,263 @@
+import os
+import threading
+import time
+import concurrent.futures
+from datetime import timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from game_index import GameIndex
+from metrics import registry, timer
+load_dotenv()
+APIKEY = os.getenv('API_KEY')
+ODDS_API_URL = "https://api.the-odds-api.com/v4/sports/{sport}/odds"
+SCORES_API_URL = "https://api.the-odds-api.com/v4/sports/{sport}/scores"
+SPORT_KEYS = os.getenv('ODDS_SPORT_KEYS', 'upcoming').split(',')
+REGIONS = os.getenv('ODDS_REGIONS', 'us,uk,eu,au').split(',')
+MARKETS = os.getenv('ODDS_MARKETS', 'h2h').split(',')
+ODDS_FORMAT = "decimal"
+DATE_FORMAT = "iso"
+MAX_WORKERS = int(os.getenv('ODDS_MAX_WORKERS', '8'))
+# Spacing between request starts across all workers
+MAX_REQUESTS_PER_SECOND = float(os.getenv('ODDS_MAX_RPS', '5'))
+# Stop issuing requests once the remaining monthly quota would drop below this
+QUOTA_RESERVE = int(os.getenv('ODDS_QUOTA_RESERVE', '50'))
+MAX_RETRIES = 3
+# Listings with different ids are one game if teams match and start times are this
+# close; tight enough to keep the two games of a doubleheader apart
+DEDUP_TOLERANCE = timedelta(minutes=30)
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+class QuotaTracker:
+    """
+    Tracks the Odds API usage headers (x-requests-remaining / -used / -last) and
+    paces requests so concurrent workers neither trip the rate limit nor spend
+    the last `reserve` credits of the quota.
+    """
+
+    def __init__(self, reserve=QUOTA_RESERVE, max_rps=MAX_REQUESTS_PER_SECOND):
+        self.reserve = reserve
+        self.min_interval = 1.0 / max_rps if max_rps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._pending_cost = 0
+        self.remaining = None
+        self.used = None
+        self.last_cost = None
+
+    def acquire(self, cost):
+        with self._lock:
+            if self.remaining is not None and self.remaining - self._pending_cost - cost < self.reserve:
+                raise QuotaExhausted(f"{self.remaining} requests left, keeping {self.reserve} in reserve")
+            self._pending_cost += cost
+            now = time.monotonic()
+            wait = max(0.0, self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + self.min_interval
+        if wait:
+            time.sleep(wait)
+
+    def release(self, cost, headers=None):
+        with self._lock:
+            self._pending_cost -= cost
+            if headers is None:
+                return
+            remaining = headers.get("x-requests-remaining")
+            used = headers.get("x-requests-used")
+            last = headers.get("x-requests-last")
+            # Responses can arrive out of order; the smallest "remaining" is the freshest
+            if remaining is not None:
+                remaining = int(float(remaining))
+                self.remaining = remaining if self.remaining is None else min(self.remaining, remaining)
+            if used is not None:
+                used = int(float(used))
+                self.used = used if self.used is None else max(self.used, used)
+            if last is not None:
+                self.last_cost = int(float(last))
+
+    def snapshot(self):
+        with self._lock:
+            return {"remaining": self.remaining, "used": self.used, "last_cost": self.last_cost}
+
+
+quota = QuotaTracker()
+
+
+def _quota_samples():
+    snapshot = quota.snapshot()
+    return [
+        ("odds_api_requests_remaining", "Odds API credits left this month", snapshot["remaining"], {}),
+        ("odds_api_requests_used", "Odds API credits used this month", snapshot["used"], {}),
+        ("odds_api_last_request_cost", "Credits charged for the latest Odds API request", snapshot["last_cost"], {}),
+    ]
+
+
+registry.register_collector(_quota_samples)
+
+
+def make_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_json(session, url, params, cost, tracker, label):
+    """The decoded response, or None if the API answered with an error or kept rate limiting us."""
+    endpoint = url.rsplit("/", 1)[-1]
+    for attempt in range(MAX_RETRIES):
+        tracker.acquire(cost)
+        headers = None
+        try:
+            with timer("odds_api_request", endpoint=endpoint):
+                response = session.get(url, params=params, timeout=10)
+            headers = response.headers
+        finally:
+            tracker.release(cost, headers)
+        registry.inc("odds_api_responses_total", help_text="Odds API responses by status",
+                     endpoint=endpoint, status=response.status_code)
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            time.sleep(float(retry_after) if retry_after else 2 ** attempt)
+            continue
+        if response.status_code != 200:
+            print(f"Error fetching {label}: {response.status_code}, {response.text}")
+            return None
+        return response.json()
+    print(f"Giving up on {label} after {MAX_RETRIES} rate-limited attempts")
+    return None
+
+
+def _fetch_one(session, sport, region, markets, tracker):
+    # The API charges one credit per market per region
+    cost = len(markets)
+    params = {
+        "apiKey": APIKEY,
+        "regions": region,
+        "markets": ",".join(markets),
+        "oddsFormat": ODDS_FORMAT,
+        "dateFormat": DATE_FORMAT,
+    }
+    return _get_json(session, ODDS_API_URL.format(sport=sport), params, cost, tracker, f"odds for {sport}/{region}")
+
+
+def _fetch_scores_one(session, sport, days_from, tracker):
+    # Scores cost one credit, two when reaching back into completed games
+    cost = 2 if days_from else 1
+    params = {"apiKey": APIKEY, "dateFormat": DATE_FORMAT}
+    if days_from:
+        params["daysFrom"] = days_from
+    return _get_json(session, SCORES_API_URL.format(sport=sport), params, cost, tracker, f"scores for {sport}")
+
+
+def merge_events(payloads):
+    """
+    Fold the per-region responses into one event per game, with the
+    bookmakers from every region side by side (each bookmaker listed once).
+    Events are the same game when their ids match or, failing that, when a
+    GameIndex matches their teams and start time and the ids don't disagree.
+    A game first listed without an id takes the id of a later listing.
+    """
+    merged = []
+    by_id = {}
+    index = GameIndex(tolerance=DEDUP_TOLERANCE)
+    for payload in payloads:
+        for event in payload:
+            game_id = event.get("id")
+            target = by_id.get(game_id) if game_id else None
+            if target is None:
+                listed = event.get("home_team") and event.get("away_team") and event.get("commence_time")
+                known = index.find(event["home_team"], event["away_team"], event["commence_time"]) if listed else None
+                if known is not None and not (game_id and known.get("id") and known["id"] != game_id):
+                    target = known
+                    if game_id and not target.get("id"):
+                        target["id"] = game_id
+                else:
+                    target = dict(event, bookmakers=[], _seen_bookmakers=set())
+                    merged.append(target)
+                    if listed:
+                        index.add(target)
+                if game_id:
+                    by_id[game_id] = target
+            for bookmaker in event.get("bookmakers", []):
+                key = bookmaker.get("key", bookmaker.get("title"))
+                if key in target["_seen_bookmakers"]:
+                    continue
+                target["_seen_bookmakers"].add(key)
+                target["bookmakers"].append(bookmaker)
+    for event in merged:
+        del event["_seen_bookmakers"]
+    return merged
+
+
+def fetch_odds(sports=None, regions=None, markets=None, max_workers=MAX_WORKERS, session=None, tracker=None):
+    """
+    Fetch every (sport, region) combination concurrently over one pooled session
+    and return the merged list of events in the Odds API payload format.
+    """
+    sports = sports or SPORT_KEYS
+    regions = regions or REGIONS
+    markets = markets or MARKETS
+    tracker = tracker or quota
+    own_session = session is None
+    session = session or make_session(max_workers)
+    payloads = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_fetch_one, session, sport, region, markets, tracker): (sport, region)
+                for sport in sports
+                for region in regions
+            }
+            for future in concurrent.futures.as_completed(futures):
+                sport, region = futures[future]
+                try:
+                    payload = future.result()
+                    if payload is not None:
+                        payloads.append(payload)
+                except QuotaExhausted as e:
+                    print(f"Skipping {sport}/{region}: {e}")
+                except Exception as e:
+                    print(f"Error fetching odds for {sport}/{region}: {e}")
+    finally:
+        if own_session:
+            session.close()
+    return merge_events(payloads)
+
+
+def fetch_scores(sports, days_from=3, max_workers=MAX_WORKERS, session=None, tracker=None):
+    """
+    Fetch the scores feed for every sport concurrently; returns {sport: [game, ...]}.
+    `sports` may also be a {sport: days_from} mapping to reach back a different
+    distance per sport. Sports whose feed could not be read are left out.
+    """
+    if not isinstance(sports, dict):
+        sports = dict.fromkeys(sports, days_from)
+    tracker = tracker or quota
+    own_session = session is None
+    session = session or make_session(max_workers)
+    scores = {}
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_fetch_scores_one, session, sport, sport_days_from, tracker): sport
+                for sport, sport_days_from in sports.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                sport = futures[future]
+                try:
+                    games = future.result()
+                    if games is not None:
+                        scores[sport] = games
+                except QuotaExhausted as e:
+                    print(f"Skipping scores for {sport}: {e}")
+                except Exception as e:
+                    print(f"Error fetching scores for {sport}: {e}")
+    finally:
+        if own_session:
+            session.close()
+    return scores
@@ -0,0 +1,120 @@
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+from line_shopping import flatten_odds
+
+def partition_name(day):
+    return f"odds_snapshots_{day:%Y%m%d}"
+
+
+def ensure_partition(cur, day):
+    """
+    Create the odds_snapshots partition holding `day` (UTC) if it is missing.
+    The catalog is checked first, so steady-state runs don't take the lock on
+    odds_snapshots that CREATE TABLE ... PARTITION OF needs. The check runs in
+    the caller's transaction, so a partition created by a run that rolled back
+    is created again.
+    """
+    cur.execute("SELECT to_regclass(%s)", (partition_name(day),))
+    if cur.fetchone()[0] is not None:
+        return
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF odds_snapshots
+        FOR VALUES FROM (%s) TO (%s)
+        """,
+        (start, start + timedelta(days=1)),
+    )
+
+
+def record_snapshots(cur, events, fetched_at, market="h2h"):
+    """
+    Append every (game, bookmaker, outcome, price) quoted in an Odds API payload,
+    stamped with `fetched_at`, in one COPY. Runs in the caller's transaction and
+    returns the number of snapshots written.
+    """
+    table = flatten_odds(events, market)
+    if not len(table["price"]):
+        return 0
+    ensure_partition(cur, fetched_at.astimezone(timezone.utc).date())
+    game_ids = [event.get("id") for event in events]
+    selection_event, selection_name = table["selection_event"], table["selection_name"]
+    bookmaker_names = table["bookmaker_names"]
+    stamp = fetched_at.isoformat()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    written = 0
+    for selection, bookmaker, price in zip(table["selection"].tolist(), table["bookmaker"].tolist(), table["price"].tolist()):
+        game_id = game_ids[selection_event[selection]]
+        if game_id is None:
+            continue
+        writer.writerow((game_id, bookmaker_names[bookmaker], selection_name[selection], price, stamp))
+        written += 1
+    buffer.seek(0)
+    cur.copy_expert(
+        "COPY odds_snapshots (game_id, bookmaker, outcome, price, fetched_at) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+    return written
+
+
+def line_movement(cur, game_id, bookmaker=None, outcome=None, since=None):
+    """
+    How a game's prices moved: [(fetched_at, bookmaker, outcome, price), ...]
+    in time order, keeping only the first snapshot and each change after it.
+    `since` limits the scan to recent partitions.
+    """
+    clauses = ["game_id = %s"]
+    params = [game_id]
+    if bookmaker is not None:
+        clauses.append("bookmaker = %s")
+        params.append(bookmaker)
+    if outcome is not None:
+        clauses.append("outcome = %s")
+        params.append(outcome)
+    if since is not None:
+        clauses.append("fetched_at >= %s")
+        params.append(since)
+    cur.execute(
+        f"""
+        SELECT fetched_at, bookmaker, outcome, price
+        FROM (
+            SELECT fetched_at, bookmaker, outcome, price,
+                   lag(price) OVER (PARTITION BY bookmaker, outcome ORDER BY fetched_at) AS previous
+            FROM odds_snapshots
+            WHERE {" AND ".join(clauses)}
+        ) s
+        WHERE previous IS DISTINCT FROM price
+        ORDER BY fetched_at, bookmaker, outcome
+        """,
+        params,
+    )
+    return cur.fetchall()
+
+
+def closing_prices(cur, game_ids, lookback=timedelta(days=7)):
+    """
+    {game_id: {bookmaker: {outcome: price}}}: each bookmaker's last price
+    before the game started (event_time in events). Only the partitions within
+    `lookback` of the start times are read.
+    """
+    cur.execute(
+        """
+        SELECT DISTINCT ON (s.game_id, s.bookmaker, s.outcome) s.game_id, s.bookmaker, s.outcome, s.price
+        FROM odds_snapshots s
+        JOIN events e ON e.game_id = s.game_id
+        WHERE s.game_id = ANY(%s)
+          AND s.fetched_at <= e.event_time
+          AND s.fetched_at >= e.event_time - %s
+          AND s.fetched_at >= (SELECT min(event_time) FROM events WHERE game_id = ANY(%s)) - %s
+          AND s.fetched_at <= (SELECT max(event_time) FROM events WHERE game_id = ANY(%s))
+        ORDER BY s.game_id, s.bookmaker, s.outcome, s.fetched_at DESC
+        """,
+        (list(game_ids), lookback, list(game_ids), lookback, list(game_ids)),
+    )
+    closing = {}
+    for game_id, bookmaker, outcome, price in cur.fetchall():
+        closing.setdefault(game_id, {}).setdefault(bookmaker, {})[outcome] = price
+    return closing
@@ -1,132 +1,286 @@
-import requests
-import psycopg2
-from psycopg2.extras import DictCursor
-from datetime import datetime, timezone
+import math
 import os
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import DictCursor, Json, execute_values
+from db import connection
+from game_index import GameIndex
+from metrics import span
+from odds_fetcher import DEDUP_TOLERANCE, fetch_scores
+from schema import ensure_schema
 
-# Replace with your actual API key
-THE_ODDS_API_KEY = "<YOUR_API_KEY>"
+# The furthest back the scores feed reaches for completed games
+SCORES_DAYS_FROM = 3
+# Bets on games that started less than this long ago can't be final yet
+MIN_GAME_DURATION = timedelta(hours=float(os.getenv('SETTLE_MIN_GAME_HOURS', '2')))
+# Don't re-read a sport's scores feed more often than this
+SCORES_REFRESH = timedelta(seconds=float(os.getenv('SETTLE_SCORES_REFRESH_SECONDS', '300')))
+# Bets without a game_id match a completed game of the same sport and teams
+# starting within this long of the bet's event_time. Kept tight so the two
+# games of a doubleheader can't be mistaken for each other.
+MATCH_TOLERANCE = DEDUP_TOLERANCE
 
-def settle_bets_with_theoddsapi():
+
+def game_winner(game):
     """
-    Find all pending bets in paper_bets, fetch completed games 
-    from TheOddsAPI, and settle the bets accordingly.
+    Winner's name for a completed game from the scores feed, "draw" on a tie,
+    or None when the scores can't be parsed. For example:
+        scores = [
+          {"name": "Houston Rockets", "score": "108"},
+          {"name": "Chicago Bulls", "score": "104"}
+        ]
+    """
+    scores = game.get("scores") or []
+    if len(scores) != 2:
+        return None
+    try:
+        s1 = int(scores[0]["score"])
+        s2 = int(scores[1]["score"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if s1 > s2:
+        return scores[0]["name"]
+    if s2 > s1:
+        return scores[1]["name"]
+    return "draw"
+
+
+def find_game(bet, games_by_id, index):
+    """
+    The completed game a bet is on. A bet with a game_id only ever matches that
+    game; one without is matched on sport, teams and start time through a
+    GameIndex over the same games.
+    """
+    if bet["game_id"]:
+        return games_by_id.get(bet["game_id"])
+    if bet["home_team"] and bet["away_team"] and bet["event_time"]:
+        return index.find(bet["home_team"], bet["away_team"], bet["event_time"], sport=bet["sport"])
+    return None
+
+
+def index_games(games_by_id):
+    return GameIndex(
+        (g for g in games_by_id.values() if g.get("home_team") and g.get("away_team") and g.get("commence_time")),
+        tolerance=MATCH_TOLERANCE,
+    )
+
+
+def settle_outcomes(pending_bets, games_by_id):
+    """
+    Work out in memory how each pending bet settles against the completed
+    games. Bets are matched on game_id, or on sport, teams and start time
+    for bets without a provider id. Returns [(bet_id, status, payout), ...];
+    bets whose game isn't completed (or has unreadable scores) are left out
+    and stay pending.
+    """
+    settlements = []
+    index = index_games(games_by_id)
+    for bet in pending_bets:
+        bet_id = bet["bet_id"]
+        game_id = bet["game_id"]
+        game = find_game(bet, games_by_id, index)
+        if game is None:
+            print(f"Bet {bet_id}: no completed game found for game_id={game_id} in sport={bet['sport']}")
+            continue
+        winner = game_winner(game)
+        if winner is None:
+            print(f"Bet {bet_id}: can't parse final scores for {game_id}")
+            continue
+        chosen_team = bet["chosen_team"]
+        if winner.lower() == chosen_team.lower():
+            payout = float(bet["stake"]) * float(bet["odds"])
+            settlements.append((bet_id, "won", payout))
+            print(f"Bet {bet_id} on {chosen_team} WON. Payout = {payout:.2f}")
+        else:
+            # A draw settles as a loss
+            settlements.append((bet_id, "lost", 0))
+            print(f"Bet {bet_id} on {chosen_team} LOST.")
+    return settlements
+
+
+def apply_settlements(cur, settlements):
+    """
+    Write every settlement with one set-based UPDATE. Only rows that are still
+    pending change, so a run that overlaps another can't settle a bet twice.
+    Returns the ids of the bets settled.
+    """
+    if not settlements:
+        return []
+    update_sql = """
+        UPDATE paper_bets AS b
+        SET bet_status = v.bet_status,
+            actual_payout = v.actual_payout
+        FROM (VALUES %s) AS v (bet_id, bet_status, actual_payout)
+        WHERE b.bet_id = v.bet_id
+          AND b.bet_status = 'pending'
+        RETURNING b.bet_id
+    """
+    settled = execute_values(
+        cur, update_sql, settlements, template="(%s, %s, %s::numeric)", page_size=len(settlements), fetch=True
+    )
+    return [bet_id for (bet_id,) in settled]
+
+
+def load_completed_games(cur, pending_bets):
     """
-    # 1. Fetch all pending bets
+    Cached completed games the pending bets could be on, as {game_id: game} in
+    the scores feed format: those with a bet's game_id, plus, for bets without
+    one, any starting in those bets' time span.
+    """
+    times = [bet["event_time"] for bet in pending_bets if not bet["game_id"]]
+    cur.execute(
+        """
+        SELECT game_id, sport, home_team, away_team, commence_time, scores
+        FROM completed_games
+        WHERE game_id = ANY(%s)
+           OR commence_time BETWEEN %s AND %s
+        """,
+        (
+            [bet["game_id"] for bet in pending_bets if bet["game_id"]],
+            min(times) - MATCH_TOLERANCE if times else None,
+            max(times) + MATCH_TOLERANCE if times else None,
+        ),
+    )
+    return {
+        game_id: {
+            "id": game_id,
+            "sport_key": sport,
+            "home_team": home_team,
+            "away_team": away_team,
+            "commence_time": commence_time,
+            "completed": True,
+            "scores": scores,
+        }
+        for game_id, sport, home_team, away_team, commence_time, scores in cur.fetchall()
+    }
+
+
+def store_completed_games(cur, games):
+    """Cache completed games from the scores feed; a game's result never changes once final."""
+    rows = [
+        (
+            game["id"],
+            game.get("sport_key"),
+            game.get("home_team"),
+            game.get("away_team"),
+            game.get("commence_time"),
+            Json(game.get("scores")),
+        )
+        for game in games
+    ]
+    if not rows:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO completed_games (game_id, sport, home_team, away_team, commence_time, scores)
+        VALUES %s
+        ON CONFLICT (game_id) DO NOTHING
+        """,
+        rows,
+        page_size=len(rows),
+    )
+
+
+def scores_to_fetch(pending_bets, cached, watermarks, now, refresh=SCORES_REFRESH):
+    """
+    {sport: days_from} for the sports whose feed is worth reading: some bet's
+    game isn't cached yet and the feed wasn't read within `refresh`.
+    days_from reaches back just far enough for the oldest such bet.
+    """
+    oldest = {}
+    index = index_games(cached)
+    for bet in pending_bets:
+        if find_game(bet, cached, index) is not None:
+            continue
+        sport = bet["sport"]
+        fetched_at = watermarks.get(sport)
+        if fetched_at is not None and now - fetched_at < refresh:
+            continue
+        if sport not in oldest or bet["event_time"] < oldest[sport]:
+            oldest[sport] = bet["event_time"]
+    return {
+        sport: min(SCORES_DAYS_FROM, max(1, math.ceil((now - event_time) / timedelta(days=1))))
+        for sport, event_time in oldest.items()
+    }
+
+
+@span("settle_bets")
+def settle_bets(bet_ids=None, refresh=SCORES_REFRESH):
+    """
+    Settle pending bets (all of them, or just `bet_ids`) whose games could be
+    over, and return the ids of the bets settled.
+
+    Completed games are cached in completed_games, so a game is downloaded
+    once. A sport's feed is only read when one of its bets is still missing a
+    result and the feed's watermark (settlement_watermark) is older than
+    `refresh`.
+    """
+    ensure_schema()
+    now = datetime.now(timezone.utc)
+    # 1. Fetch the pending bets whose games could be over by now
     select_sql = """
         SELECT bet_id, game_id, sport, home_team, away_team, event_time, chosen_team, stake, odds
         FROM paper_bets
         WHERE bet_status = 'pending'
-          AND event_time < NOW()  -- only settle events in the past
+          AND event_time < %s
+          AND (%s::boolean OR bet_id = ANY(%s))
         ORDER BY event_time
     """
 
-    DB_CONN = os.getenv('DATABASE_URL')
-
-    try:
-        conn = psycopg2.connect(DB_CONN, sslmode='require')
+    with connection() as conn:
         cur = conn.cursor(cursor_factory=DictCursor)
-        cur.execute(select_sql)
+        cur.execute(select_sql, (now - MIN_GAME_DURATION, bet_ids is None, list(bet_ids or ())))
         pending_bets = cur.fetchall()
+        if not pending_bets:
+            conn.commit()
+            cur.close()
+            print("No pending bets to settle.")
+            return []
+        cached = load_completed_games(cur, pending_bets)
+        cur.execute("SELECT sport, scores_fetched_at FROM settlement_watermark")
+        watermarks = dict(cur.fetchall())
+        conn.commit()
+        cur.close()
 
-        # Group bets by sport to minimize API calls:
-        # e.g., { 'basketball_nba': [ bet1, bet2, ... ] }
-        bets_by_sport = {}
-        for bet in pending_bets:
-            sport = bet["sport"]  # you might store "basketball_nba" in your DB
-            bets_by_sport.setdefault(sport, []).append(bet)
-
-        for sport_key, bets_list in bets_by_sport.items():
-            # 2. Call TheOddsAPI scores endpoint for this sport
-            #  (we might get games for the last 2 days, for instance)
-            url = f"https://api.the-odds-api.com/v4/sports/{sport_key}/scores"
-            params = {
-                "apiKey": THE_ODDS_API_KEY,
-                "daysFrom": 3,     # how many days back you want results
-            }
-            try:
-                resp = requests.get(url, params=params, timeout=10)
-                resp.raise_for_status()
-                completed_games = resp.json()  # list of completed games
-
-                # 3. Create a dict of games by their ID
-                #    to quickly find them by `oddsapi_game_id`.
-                #    If you don't have `oddsapi_game_id`, you'll need 
-                #    to match by home_team, away_team, commence_time, etc.
-                games_by_id = {game["id"]: game for game in completed_games if game["completed"] == True}
-
-                # 4. For each pending bet in this sport, try to find the game result
-                for bet in bets_list:
-                    bet_id = bet["bet_id"]
-                    game_id = bet["oddsapi_game_id"]
-                    # if we have a game_id stored, try to find it:
-                    if game_id in games_by_id:
-                        game_data = games_by_id[game_id]
-                        # figure out the winner from game_data["scores"]
-                        home_team_name = game_data["home_team"]
-                        away_team_name = game_data["away_team"]
-                        scores = game_data.get("scores", [])
-
-                        # Example: 
-                        # scores = [
-                        #   {"name": "Houston Rockets", "score": "108"},
-                        #   {"name": "Chicago Bulls", "score": "104"}
-                        # ]
-                        if len(scores) == 2:
-                            score1 = scores[0]
-                            score2 = scores[1]
-                            # compare numeric scores
-                            s1 = int(score1["score"])
-                            s2 = int(score2["score"])
-
-                            # figure out who is winner
-                            if s1 > s2:
-                                winner = score1["name"]
-                            elif s2 > s1:
-                                winner = score2["name"]
-                            else:
-                                winner = "draw"
-
-                            chosen_team = bet["chosen_team"]
-                            stake = float(bet["stake"])
-                            odds = float(bet["odds"])
-
-                            # 5. Update bet status
-                            if winner.lower() == chosen_team.lower():
-                                # bet won
-                                payout = stake * odds
-                                update_sql = """
-                                    UPDATE paper_bets
-                                    SET bet_status = 'won',
-                                        actual_payout = %s
-                                    WHERE bet_id = %s
-                                """
-                                cur.execute(update_sql, (payout, bet_id))
-                                print(f"Bet {bet_id} on {chosen_team} WON. Payout = {payout:.2f}")
-                            else:
-                                # bet lost (or draw => lost, depending on your logic)
-                                update_sql = """
-                                    UPDATE paper_bets
-                                    SET bet_status = 'lost',
-                                        actual_payout = 0
-                                    WHERE bet_id = %s
-                                """
-                                cur.execute(update_sql, (bet_id,))
-                                print(f"Bet {bet_id} on {chosen_team} LOST.")
-                        else:
-                            # no valid scores
-                            print(f"Bet {bet_id}: can't parse final scores for {game_id}")
-                    else:
-                        # If you don't have a game_id, or can't find this game 
-                        # in the result, you might fallback to partial matching
-                        print(f"Bet {bet_id}: no completed game found for game_id={game_id} in sport={sport_key}")
-
-                # commit after processing each sport
-                conn.commit()
-            except Exception as e:
-                print(f"Error fetching or processing TheOddsAPI for {sport_key}: {e}")
+    # 2. Only the feeds that can still settle something, all sports at once;
+    #    no connection is held while waiting on the API
+    scores = fetch_scores(scores_to_fetch(pending_bets, cached, watermarks, now, refresh))
+    fetched = [game for games in scores.values() for game in games if game.get("completed")]
+    games_by_id = dict(cached)
+    games_by_id.update((game["id"], game) for game in fetched)
 
+    # 3. Outcomes are computed in memory; the cache, the watermarks and the
+    #    settlements are written in a single transaction. Only feeds that were
+    #    actually read (fetch_scores leaves failed ones out) move their watermark.
+    settlements = settle_outcomes(pending_bets, games_by_id)
+    with connection() as conn:
+        cur = conn.cursor()
+        store_completed_games(cur, fetched)
+        if scores:
+            execute_values(
+                cur,
+                """
+                INSERT INTO settlement_watermark (sport, scores_fetched_at)
+                VALUES %s
+                ON CONFLICT (sport) DO UPDATE SET scores_fetched_at = EXCLUDED.scores_fetched_at
+                """,
+                [(sport, now) for sport in scores],
+            )
+        settled = apply_settlements(cur, settlements)
+        conn.commit()
         cur.close()
-        conn.close()
+    print(f"Fetched scores for {len(scores)} sports, {len(cached)} games served from cache.")
+    print(f"Settled {len(settled)} of {len(pending_bets)} pending bets.")
+    return settled
+
+
+def settle_bets_with_theoddsapi():
+    """
+    Find all pending bets in paper_bets, fetch completed games
+    from TheOddsAPI, and settle the bets accordingly.
+    """
+    try:
+        return len(settle_bets())
     except Exception as e:
         print(f"Error settling bets: {e}")
+        return 0
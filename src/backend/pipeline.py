@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import os, math, time, queue, threading, collections, multiprocessing, concurrent.futures
+from article_store import ArticleStore, dedup_ratio
+from db import connection
+from http_cache import HttpCache
+from link_matcher import TeamMatcher
+from metrics import registry
+from schema import ensure_schema
+from scraper import NEWS_URLS, Scraper
+from sentiment import get_events_from_db, upsert_prediction_rows
+from team_sentiment import fold_articles, team_sentiments
+
+alpha = 0.5
+threshold = 0.05
+bankroll = 1000
+# Events per unit of work flowing between the stages
+CHUNK_SIZE = int(os.getenv('PIPELINE_CHUNK_SIZE', '10'))
+# Chunks allowed to wait between two stages before the upstream stage blocks
+QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))
+SCORE_WORKERS = int(os.getenv('PIPELINE_SCORE_WORKERS', str(os.cpu_count() or 2)))
+WRITE_BATCH = int(os.getenv('PIPELINE_WRITE_BATCH', '50'))
+# The scoring pool starts while the scrape thread is busy; forking a threaded
+# process can leave a child stuck on a lock some other thread held, so workers
+# come from a fork server (or are spawned where there is none) instead
+MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def sigmoid(x):
+    # Written this way round so large sentiment gaps can't overflow math.exp
+    if x >= 0:
+        return 1 / (1 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1 + z)
+
+
+def evaluate_event(event, home_state, away_state):
+    """
+    Turn the teams' (decayed mean sentiment, articles) state into a predictions
+    row (or None when a team has no articles yet) and a report.
+    """
+    home_team, away_team = event.home_team, event.away_team
+    lines = [
+        f"Processing Event: {event.sport} - {home_team} vs {away_team} at {event.event_time}",
+        f"Odds: {home_team} = {event.home_team_odds}, {away_team} = {event.away_team_odds}",
+        f"Bookmakers: {home_team} from {event.home_team_bookmaker}, {away_team} from {event.away_team_bookmaker}",
+    ]
+    if home_state is None:
+        lines.append(f"No articles found for '{home_team}'. Skipping this event.")
+        return None, "\n".join(lines)
+    if away_state is None:
+        lines.append(f"No articles found for '{away_team}'. Skipping this event.")
+        return None, "\n".join(lines)
+    (avg_home_sentiment, home_articles), (avg_away_sentiment, away_articles) = home_state, away_state
+    sentiment_diff = avg_home_sentiment - avg_away_sentiment
+    predicted_prob = sigmoid(alpha * sentiment_diff)
+    home_odds_float = float(event.home_team_odds)
+    implied_prob = 1.0 / home_odds_float
+    kelly_fraction = ((home_odds_float - 1) * predicted_prob - (1 - predicted_prob)) / (home_odds_float - 1)
+    kelly_fraction = max(kelly_fraction, 0)
+    bet_amount = bankroll * kelly_fraction
+    lines.append(f"Average Home Sentiment Score: {avg_home_sentiment:.2f} ({home_articles} articles)")
+    lines.append(f"Average Away Sentiment Score: {avg_away_sentiment:.2f} ({away_articles} articles)")
+    lines.append(f"Sentiment Difference: {sentiment_diff:.2f}")
+    lines.append(f"Predicted Probability of {home_team} win (from sentiment): {predicted_prob:.3f}")
+    lines.append(f"Implied Probability from Odds: {implied_prob:.3f}")
+    if predicted_prob - implied_prob > threshold:
+        lines.append("Asymmetric opportunity detected! Favorable betting conditions.")
+    else:
+        lines.append("No significant asymmetry in the odds detected.")
+    lines.append(f"Kelly Fraction: {kelly_fraction:.3f}")
+    lines.append(f"Recommended Bet Amount: ${bet_amount:.2f}")
+    row = (
+        event.game_id,
+        event.sport,
+        home_team,
+        away_team,
+        event.event_time,
+        avg_home_sentiment,
+        avg_away_sentiment,
+        sentiment_diff,
+        predicted_prob,
+        kelly_fraction,
+        bet_amount,
+        event.home_team_bookmaker,
+        event.away_team_bookmaker,
+    )
+    return row, "\n".join(lines)
+
+
+# Each scoring process opens its own handle on the shared article store
+_store = None
+
+
+def _init_scorer():
+    global _store
+    _store = ArticleStore()
+
+
+def score_chunk(chunk):
+    """
+    Runs in a scoring process. `chunk` is a list of (event, home_articles, away_articles);
+    every article in the chunk goes through the article store in one batch. Returns
+    the events, the (team, article_hash, score) observations they produced and the
+    store's counters for this chunk (each process's store keeps its own). The store
+    also records which of the chunk's teams each article mentions.
+    """
+    texts = [text for _, home, away in chunk for text in home + away]
+    matcher = TeamMatcher({team for event, _, _ in chunk for team in (event.home_team, event.away_team)})
+    before = dict(_store.stats)
+    keyed = iter(_store.score_keyed(texts, matcher))
+    events = []
+    observations = []
+    for event, home, away in chunk:
+        events.append(event)
+        for team, articles in ((event.home_team, home), (event.away_team, away)):
+            for _ in articles:
+                hash_, score, _ = next(keyed)
+                observations.append((team, hash_, score))
+    stats = {kind: count - before[kind] for kind, count in _store.stats.items()}
+    return events, observations, stats
+
+
+def fold_chunk(events, observations):
+    """
+    Fold a scored chunk into the team sentiment state and evaluate its events
+    from the updated state. Returns [(row or None, report), ...].
+    """
+    teams = {team for event in events for team in (event.home_team, event.away_team)}
+    with connection() as conn:
+        cur = conn.cursor()
+        fold_articles(cur, observations)
+        state = team_sentiments(cur, teams)
+        conn.commit()
+        cur.close()
+    return [evaluate_event(event, state.get(event.home_team), state.get(event.away_team)) for event in events]
+
+
+def run_pipeline(events, urls=NEWS_URLS, chunk_size=CHUNK_SIZE, score_workers=SCORE_WORKERS, write_batch=WRITE_BATCH):
+    """
+    Scrape -> score -> write, as three overlapping stages joined by bounded queues:
+    a scraper thread (one shared session and cache, every front page read once),
+    a process pool scoring articles, and this thread folding new articles into the
+    team sentiment state and writing predictions in batches.
+    Returns the number of predictions written.
+    """
+    ensure_schema()
+    scraped = queue.Queue(maxsize=QUEUE_SIZE)
+    scored = queue.Queue(maxsize=QUEUE_SIZE)
+    busy = collections.Counter()
+    # Set when a downstream stage gives up, so the scraper stops instead of
+    # blocking forever on a queue nobody reads any more
+    stop = threading.Event()
+
+    def put_scraped(item):
+        while not stop.is_set():
+            try:
+                scraped.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def scrape_stage():
+        started = time.perf_counter()
+        cache = HttpCache()
+        scraper = Scraper(cache=cache)
+        try:
+            teams = [team for event in events for team in (event.home_team, event.away_team)]
+            links = scraper.collect_links(teams, urls)
+            texts = {}
+            for start in range(0, len(events), chunk_size):
+                chunk = events[start:start + chunk_size]
+                wanted = [link for event in chunk for team in (event.home_team, event.away_team) for link in links.get(team, [])]
+                texts.update(scraper.fetch_articles(link for link in wanted if link not in texts))
+                busy["scrape"] += time.perf_counter() - started
+                if not put_scraped([
+                    (
+                        event,
+                        [texts[link] for link in links.get(event.home_team, []) if texts.get(link)],
+                        [texts[link] for link in links.get(event.away_team, []) if texts.get(link)],
+                    )
+                    for event in chunk
+                ]):
+                    break
+                started = time.perf_counter()
+        except Exception as e:
+            print(f"Error in scrape stage: {e}")
+        finally:
+            scraper.close()
+            cache.close()
+            put_scraped(None)
+
+    def score_stage():
+        pending = collections.deque()
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=score_workers, mp_context=MP_CONTEXT, initializer=_init_scorer) as pool:
+                while True:
+                    chunk = scraped.get()
+                    if chunk is not None:
+                        pending.append((time.perf_counter(), pool.submit(score_chunk, chunk)))
+                    # Hand results on in order, blocking only when too much is in flight
+                    while pending and (chunk is None or len(pending) >= 2 * score_workers or pending[0][1].done()):
+                        submitted, future = pending.popleft()
+                        try:
+                            results = future.result()
+                            busy["score"] += time.perf_counter() - submitted
+                            scored.put(results)
+                        except concurrent.futures.BrokenExecutor:
+                            raise
+                        except Exception as e:
+                            print(f"Error in score stage: {e}")
+                    if chunk is None:
+                        break
+        except Exception as e:
+            # A scoring process died (OOM, segfault) and took the pool with it
+            print(f"Error in score stage, stopping the pipeline: {e}")
+            stop.set()
+        finally:
+            scored.put(None)
+
+    threads = [
+        threading.Thread(target=scrape_stage, name="scrape", daemon=True),
+        threading.Thread(target=score_stage, name="score", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    written = 0
+    batch = []
+    dedup = collections.Counter()
+    try:
+        while True:
+            scored_chunk = scored.get()
+            if scored_chunk is None:
+                break
+            chunk_events, observations, stats = scored_chunk
+            dedup.update(stats)
+            for kind, count in stats.items():
+                registry.inc("article_store_articles_total", count, help_text="Articles through the article store, by outcome", kind=kind)
+            started = time.perf_counter()
+            try:
+                results = fold_chunk(chunk_events, observations)
+            except Exception as e:
+                print(f"Error updating team sentiment: {e}")
+                continue
+            finally:
+                busy["write"] += time.perf_counter() - started
+            for row, report in results:
+                print("\n" + "=" * 50)
+                print(report)
+                print("=" * 50)
+                if row is not None:
+                    batch.append(row)
+            if len(batch) >= write_batch:
+                started = time.perf_counter()
+                written += upsert_prediction_rows(batch)
+                busy["write"] += time.perf_counter() - started
+                batch = []
+        if batch:
+            started = time.perf_counter()
+            written += upsert_prediction_rows(batch)
+            busy["write"] += time.perf_counter() - started
+    finally:
+        # Also releases the scraper if writing failed
+        stop.set()
+    for thread in threads:
+        thread.join()
+    print("Stage time: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in busy.items()))
+    registry.set("article_store_dedup_ratio", dedup_ratio(dedup), help_text="Share of the last run's articles that needed no scoring")
+    print(
+        f"Articles: {dedup['seen']} seen, {dedup['exact_duplicates']} exact and {dedup['near_duplicates']} near duplicates, "
+        f"{dedup['scored']} scored (dedup ratio {dedup_ratio(dedup):.1%})"
+    )
+    return written
+
+
+def main():
+    print("Sports Betting Sentiment Analysis (Pipelined)\n")
+    events = get_events_from_db()
+    if not events:
+        print("No events found in the database.")
+        return
+    started = time.perf_counter()
+    run_pipeline(events)
+    print(f"Processed {len(events)} events in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import hashlib
+import threading
+import psycopg2.errors
+from db import connection
+
+# Idempotent DDL for the tables and columns the backend relies on beyond the
+# original events / predictions / paper_bets / investments / profiles tables.
+# Run `python schema.py` on deploy, before starting the API: the web app never
+# applies it, so its database role needs no DDL privileges. The batch jobs
+# still call ensure_schema() when they start, but that only reads the stored
+# schema version unless this list has changed since it was last applied.
+SCHEMA_STATEMENTS = [
+    # Monotonic version bumped by every fetch_h2h run, so the API can tell
+    # whether its cached /api/events response is still current.
+    """
+    CREATE TABLE IF NOT EXISTS events_version (
+        id boolean PRIMARY KEY DEFAULT true CHECK (id),
+        version bigint NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT INTO events_version (id, version) VALUES (true, 0) ON CONFLICT (id) DO NOTHING",
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS events_version_idx ON events (version)",
+    # Keyset pagination and time-window filters on /api/events
+    "CREATE INDEX IF NOT EXISTS events_time_game_idx ON events (event_time, game_id)",
+    "CREATE INDEX IF NOT EXISTS events_sport_time_game_idx ON events (sport, event_time, game_id)",
+    # sentiment.get_events_from_db: upcoming events that have both odds
+    """
+    CREATE INDEX IF NOT EXISTS events_priced_time_idx ON events (event_time)
+    WHERE home_team_odds IS NOT NULL AND away_team_odds IS NOT NULL
+    """,
+    # fetch_h2h upserts on game_id. Fails on databases that still hold the
+    # duplicate rows older runs inserted: run `python schema.py --dedupe-events` once.
+    "CREATE UNIQUE INDEX IF NOT EXISTS events_game_id_key ON events (game_id)",
+    # Exponentially decayed sentiment per team (team_sentiment.py). Each article
+    # is folded into a team's state once; the article table remembers which.
+    """
+    CREATE TABLE IF NOT EXISTS team_sentiment (
+        team text PRIMARY KEY,
+        weighted_sum double precision NOT NULL,
+        weight double precision NOT NULL,
+        articles integer NOT NULL,
+        updated_at timestamptz NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS team_sentiment_articles (
+        team text NOT NULL,
+        article_hash text NOT NULL,
+        score double precision NOT NULL,
+        seen_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (team, article_hash)
+    )
+    """,
+    # paper_bet settlement: completed games already pulled from the scores feed,
+    # and when each sport's feed was last read
+    """
+    CREATE TABLE IF NOT EXISTS completed_games (
+        game_id text PRIMARY KEY,
+        sport text NOT NULL,
+        home_team text,
+        away_team text,
+        commence_time timestamptz,
+        scores jsonb,
+        fetched_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS completed_games_commence_idx ON completed_games (commence_time)",
+    """
+    CREATE TABLE IF NOT EXISTS settlement_watermark (
+        sport text PRIMARY KEY,
+        scores_fetched_at timestamptz NOT NULL
+    )
+    """,
+    # Append-only odds history (odds_history.py), one partition per UTC day;
+    # partitions are created as data for a new day arrives
+    """
+    CREATE TABLE IF NOT EXISTS odds_snapshots (
+        game_id text NOT NULL,
+        bookmaker text NOT NULL,
+        outcome text NOT NULL,
+        price real NOT NULL,
+        fetched_at timestamptz NOT NULL
+    ) PARTITION BY RANGE (fetched_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS odds_snapshots_game_idx
+    ON odds_snapshots (game_id, bookmaker, outcome, fetched_at)
+    """,
+    # /api/invest: a retried request with the same key must not debit twice
+    "ALTER TABLE investments ADD COLUMN IF NOT EXISTS idempotency_key text",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS investments_idempotency_key_idx
+    ON investments (auth0_id, idempotency_key) WHERE idempotency_key IS NOT NULL
+    """,
+    # settlement_scheduler.py LISTENs on this channel to hear about new bets
+    """
+    CREATE OR REPLACE FUNCTION notify_paper_bet_placed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('paper_bet_placed', NEW.bet_id::text);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'paper_bets_notify_placed') THEN
+            CREATE TRIGGER paper_bets_notify_placed
+            AFTER INSERT ON paper_bets
+            FOR EACH ROW EXECUTE FUNCTION notify_paper_bet_placed();
+        END IF;
+    END
+    $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS paper_bets_pending_time_idx ON paper_bets (event_time)
+    WHERE bet_status = 'pending'
+    """,
+]
+
+# Changes whenever SCHEMA_STATEMENTS does, so an edited list is applied again
+SCHEMA_VERSION = hashlib.sha1("\n".join(SCHEMA_STATEMENTS).encode("utf-8")).hexdigest()
+
+_applied = False
+_lock = threading.Lock()
+
+
+def _applied_version(cur):
+    cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute("SELECT version FROM schema_version WHERE id")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def ensure_schema(force=False):
+    """
+    Apply SCHEMA_STATEMENTS unless the database already records this
+    SCHEMA_VERSION. Several statements (ALTER TABLE) take ACCESS EXCLUSIVE
+    locks even when there is nothing to do, so they only run when needed.
+    """
+    global _applied
+    if _applied and not force:
+        return
+    with _lock:
+        if _applied and not force:
+            return
+        with connection() as conn:
+            cur = conn.cursor()
+            if force or _applied_version(cur) != SCHEMA_VERSION:
+                try:
+                    for statement in SCHEMA_STATEMENTS:
+                        cur.execute(statement)
+                except psycopg2.errors.UniqueViolation as e:
+                    raise RuntimeError(
+                        "events has several rows per game_id; run `python schema.py --dedupe-events` once"
+                    ) from e
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        id boolean PRIMARY KEY DEFAULT true CHECK (id),
+                        version text NOT NULL,
+                        applied_at timestamptz NOT NULL DEFAULT now()
+                    )
+                    """
+                )
+                cur.execute(
+                    """
+                    INSERT INTO schema_version (id, version) VALUES (true, %s)
+                    ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, applied_at = now()
+                    """,
+                    (SCHEMA_VERSION,),
+                )
+            conn.commit()
+            cur.close()
+        _applied = True
+
+
+def _events_serial_key(cur):
+    """The events primary key column if it is a single integer column (a serial id), else None."""
+    cur.execute(
+        """
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = 'events'::regclass AND i.indisprimary
+          AND array_length(i.indkey, 1) = 1
+          AND a.atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype)
+        """
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def dedupe_events():
+    """
+    One-off migration for databases written by the old fetch_h2h, which
+    inserted a new events row per fetch: keeps the last row inserted for each
+    game_id (highest serial primary key), deletes the rest, then builds the
+    unique index on game_id without blocking writes. Works before the rest of
+    the schema has been applied. Destructive; run it by hand, once.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        key = _events_serial_key(cur)
+        if key is None:
+            raise RuntimeError(
+                "events has no serial primary key to tell the latest copy of a game apart; dedupe it by hand"
+            )
+        cur.execute(
+            f"""
+            DELETE FROM events a
+            USING events b
+            WHERE a.game_id = b.game_id
+              AND a.{key} < b.{key}
+            """
+        )
+        deleted = cur.rowcount
+        conn.commit()
+        # CONCURRENTLY can't run inside a transaction block
+        conn.autocommit = True
+        try:
+            cur.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS events_game_id_key ON events (game_id)")
+        finally:
+            conn.autocommit = False
+            cur.close()
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the backend's schema changes.")
+    parser.add_argument("--force", action="store_true", help="apply every statement even if the schema version matches")
+    parser.add_argument("--dedupe-events", action="store_true",
+                        help="first delete all but the last inserted events row per game_id (one-off, destructive)")
+    args = parser.parse_args()
+    if args.dedupe_events:
+        print(f"Deleted {dedupe_events()} duplicate events rows.")
+    ensure_schema(force=args.force)
+    print("Schema is up to date.")
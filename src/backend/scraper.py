@@ -0,0 +1,185 @@
+import os
+import threading
+import concurrent.futures
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from http_cache import HttpCache
+from link_matcher import TeamMatcher
+from metrics import span
+
+NEWS_URLS = [
+    "https://www.espn.com/", "https://www.cbssports.com/", "https://www.si.com/",
+    "https://www.foxsports.com/", "https://sports.yahoo.com/", "https://www.nbc.com/sports",
+    "https://www.theathletic.com/", "https://www.skysports.com/", "https://www.bbc.com/sport",
+    "https://www.sportingnews.com/", "https://www.bleacherreport.com/", "https://www.eurosport.com/",
+    "https://www.sbnation.com/", "https://www.goal.com/", "https://www.90min.com/", "https://www.nfl.com/",
+    "https://www.nba.com/", "https://www.mlb.com/", "https://www.nhl.com/", "https://www.cricbuzz.com/",
+    "https://www.formula1.com/", "https://www.motorsport.com/", "https://www.sportinglife.com/",
+    "https://www.rugbyworld.com/", "https://www.worldrugby.org/", "https://www.tsn.ca/"
+]
+# Total concurrent requests for a whole run, shared by front pages and articles
+MAX_WORKERS = int(os.getenv('SCRAPE_MAX_WORKERS', '16'))
+# Concurrent requests to any single host
+PER_HOST_LIMIT = int(os.getenv('SCRAPE_PER_HOST', '2'))
+TIMEOUT = 5
+# Articles rarely change once published, so they are trusted much longer than front pages
+ARTICLE_TTL = float(os.getenv('SCRAPE_ARTICLE_TTL', '86400'))
+
+
+class Scraper:
+    """
+    Scrapes news sites for articles about a set of teams in one run.
+    Every front page is fetched and scanned once, its anchors are matched against
+    all teams with one compiled pattern, and every matching article is fetched once even
+    when it is relevant to several teams. All requests share one pooled session,
+    one worker budget and a per-host concurrency limit.
+    With an HttpCache, fresh entries are served without a request, stale ones
+    are revalidated with If-None-Match / If-Modified-Since, and the extracted
+    text of unchanged articles is reused without parsing.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, timeout=TIMEOUT, session=None, cache=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = session or self._make_session(max_workers)
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+        return slot
+
+    def _request(self, url, headers=None):
+        with self._slot(url):
+            try:
+                return self.session.get(url, timeout=self.timeout, headers=headers)
+            except requests.RequestException as e:
+                print(f"Error fetching {url}: {e}")
+                return None
+
+    def fetch_entry(self, url, ttl=None):
+        """
+        Return (body, cached_text). cached_text is the text previously extracted
+        from this exact body, or None if it has to be extracted again.
+        """
+        entry = self.cache.get(url) if self.cache else None
+        if entry and entry["fresh"]:
+            self.cache.count("hits")
+            return entry["body"], entry["text"]
+        response = self._request(url, self.cache.conditional_headers(entry) if entry else None)
+        if response is None:
+            # Better a stale copy than nothing when the site is down
+            return (entry["body"], entry["text"]) if entry else (None, None)
+        if response.status_code == 304 and entry:
+            self.cache.refresh(url, response.headers, ttl)
+            self.cache.count("revalidated")
+            return entry["body"], entry["text"]
+        if response.status_code != 200:
+            print(f"Error scraping {url}: HTTP {response.status_code}")
+            return None, None
+        if self.cache:
+            self.cache.store(url, response.text, response.headers, ttl)
+            self.cache.count("misses")
+        return response.text, None
+
+    def fetch(self, url, ttl=None):
+        """Return the page body, or None on any error or non-200 response."""
+        return self.fetch_entry(url, ttl)[0]
+
+    def extract_text(self, html):
+        art_soup = BeautifulSoup(html, 'html.parser')
+        paragraphs = [p.get_text(strip=True) for p in art_soup.find_all('p')]
+        return " ".join(paragraphs)
+
+    def _front_page(self, url, matcher):
+        html = self.fetch(url)
+        if html is None:
+            return {}
+        return matcher.match_links(html, url)
+
+    def _article(self, link):
+        html, text = self.fetch_entry(link, ARTICLE_TTL)
+        if text is not None:
+            return text
+        if html is None:
+            return ""
+        text = self.extract_text(html)
+        if self.cache:
+            self.cache.set_text(link, text)
+        return text
+
+    @span("scrape_collect_links")
+    def collect_links(self, teams, urls=NEWS_URLS):
+        """Fetch every front page once and return {team: [article link, ...]}."""
+        teams = list(dict.fromkeys(teams))
+        links_by_team = {team: [] for team in teams}
+        matcher = TeamMatcher(teams)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            front_pages = [executor.submit(self._front_page, url, matcher) for url in dict.fromkeys(urls)]
+            for future in concurrent.futures.as_completed(front_pages):
+                try:
+                    for team, links in future.result().items():
+                        links_by_team[team].extend(links)
+                except Exception as e:
+                    print(f"Error scraping front page: {e}")
+        return {team: list(dict.fromkeys(links)) for team, links in links_by_team.items()}
+
+    @span("scrape_fetch_articles")
+    def fetch_articles(self, links):
+        """Fetch each distinct link once and return {link: article text}."""
+        texts = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._article, link): link for link in dict.fromkeys(links)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    texts[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error fetching article from {futures[future]}: {e}")
+        return texts
+
+    @span("scrape_team_articles")
+    def scrape(self, teams, urls=NEWS_URLS):
+        """Return {team: [article text, ...]} for every team in `teams`."""
+        links_by_team = self.collect_links(teams, urls)
+        # Each article is fetched once, however many teams or pages point at it
+        texts = self.fetch_articles(link for links in links_by_team.values() for link in links)
+        return {
+            team: [texts[link] for link in links if texts.get(link)]
+            for team, links in links_by_team.items()
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def scrape_teams(teams, urls=NEWS_URLS, cache=None, **kwargs):
+    own_cache = cache is None
+    if own_cache:
+        cache = HttpCache()
+    scraper = Scraper(cache=cache, **kwargs)
+    try:
+        return scraper.scrape(teams, urls)
+    finally:
+        scraper.close()
+        if own_cache:
+            cache.close()
+
+
+def scrape_all_team_articles(team_name, urls=NEWS_URLS):
+    return scrape_teams([team_name], urls)[team_name]
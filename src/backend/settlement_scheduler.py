@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import heapq
+import os
+import select
+import time
+from datetime import datetime, timedelta, timezone
+from db import connection, dedicated_connection
+from paper_bet import SCORES_DAYS_FROM, settle_bets
+from schema import ensure_schema
+
+# How long after kick-off a game is expected to be final, by sport key prefix
+GAME_DURATIONS = {
+    "americanfootball": timedelta(hours=3, minutes=30),
+    "baseball": timedelta(hours=3, minutes=30),
+    "basketball": timedelta(hours=2, minutes=30),
+    "icehockey": timedelta(hours=3),
+    "soccer": timedelta(hours=2),
+}
+DEFAULT_GAME_DURATION = timedelta(hours=3)
+# Games not final when due are retried after RETRY_BASE, doubling up to RETRY_MAX
+RETRY_BASE = timedelta(seconds=float(os.getenv('SETTLE_RETRY_BASE_SECONDS', '120')))
+RETRY_MAX = timedelta(seconds=float(os.getenv('SETTLE_RETRY_MAX_SECONDS', '1800')))
+# Full reload of the pending set, in case a notification was missed
+RESCAN_INTERVAL = timedelta(seconds=float(os.getenv('SETTLE_RESCAN_SECONDS', '900')))
+NOTIFY_CHANNEL = "paper_bet_placed"
+
+
+def expected_end(sport, event_time):
+    for prefix, duration in GAME_DURATIONS.items():
+        if (sport or "").startswith(prefix):
+            return event_time + duration
+    return event_time + DEFAULT_GAME_DURATION
+
+
+class SettlementScheduler:
+    """
+    Settles paper bets shortly after their games end instead of polling the
+    whole pending set. Pending bets sit in a min-heap keyed by when their game
+    should be over; the loop sleeps until the earliest one is due (or a new
+    bet arrives over LISTEN/NOTIFY), settles every due bet in one batch, and
+    pushes back the ones whose games aren't final yet with exponential backoff.
+    """
+
+    def __init__(self, settle=settle_bets, listen=True):
+        self.settle = settle
+        self.listen = listen
+        self._heap = []
+        self._pending = {}  # bet_id -> [event_time, failed attempts]
+        self._listener = None
+        self._next_rescan = None
+
+    def schedule(self, bet_id, due_at):
+        heapq.heappush(self._heap, (due_at, bet_id))
+
+    def _add(self, rows, now):
+        for bet_id, sport, event_time in rows:
+            if bet_id in self._pending:
+                continue
+            self._pending[bet_id] = [event_time, 0]
+            self.schedule(bet_id, max(now, expected_end(sport, event_time)))
+
+    def load_pending(self, bet_ids=None):
+        """Queue pending bets (all, or `bet_ids`) still recent enough for the scores feed."""
+        now = datetime.now(timezone.utc)
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT bet_id, sport, event_time
+                FROM paper_bets
+                WHERE bet_status = 'pending'
+                  AND event_time > %s
+                  AND (%s::boolean OR bet_id = ANY(%s))
+                """,
+                (now - timedelta(days=SCORES_DAYS_FROM), bet_ids is None, list(bet_ids or ())),
+            )
+            rows = cur.fetchall()
+            conn.commit()
+            cur.close()
+        self._add(rows, now)
+        return len(rows)
+
+    def _connect_listener(self):
+        conn = dedicated_connection()
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        cur.close()
+        self._listener = conn
+
+    def _close_listener(self):
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        self._listener = None
+
+    def _wait(self, timeout):
+        """Sleep up to `timeout` seconds; return the ids of bets placed meanwhile."""
+        if self._listener is None:
+            time.sleep(timeout)
+            return []
+        try:
+            if select.select([self._listener], [], [], timeout) == ([], [], []):
+                return []
+            self._listener.poll()
+        except Exception as e:
+            # Reconnect next time round; the rescan catches anything missed
+            print(f"Lost the notification connection: {e}")
+            self._close_listener()
+            self._next_rescan = datetime.now(timezone.utc)
+            return []
+        placed = []
+        while self._listener.notifies:
+            notify = self._listener.notifies.pop(0)
+            try:
+                placed.append(int(notify.payload))
+            except ValueError:
+                pass
+        return placed
+
+    def _still_pending(self, bet_ids):
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT bet_id FROM paper_bets WHERE bet_id = ANY(%s) AND bet_status = 'pending'",
+                (bet_ids,),
+            )
+            pending = {bet_id for (bet_id,) in cur.fetchall()}
+            conn.commit()
+            cur.close()
+        return pending
+
+    def run_due(self, now):
+        """Settle every bet that is due; reschedule the ones that stay pending."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, bet_id = heapq.heappop(self._heap)
+            if bet_id in self._pending:
+                due.append(bet_id)
+        if not due:
+            return 0
+        try:
+            settled = len(self.settle(due, refresh=timedelta(0)))
+            # Bets settled elsewhere in the meantime drop out here too
+            pending = self._still_pending(due)
+        except Exception as e:
+            print(f"Error settling bets: {e}")
+            settled, pending = 0, set(due)
+        # Past what the scores feed reaches back to, a bet can't be settled from it
+        cutoff = now - timedelta(days=SCORES_DAYS_FROM)
+        for bet_id in due:
+            event_time, attempts = self._pending[bet_id]
+            if bet_id not in pending or event_time < cutoff:
+                del self._pending[bet_id]
+                continue
+            self._pending[bet_id][1] = attempts + 1
+            self.schedule(bet_id, now + min(RETRY_BASE * 2 ** attempts, RETRY_MAX))
+        return settled
+
+    def run_forever(self):
+        ensure_schema()
+        print(f"Scheduler started with {self.load_pending()} pending bets.")
+        self._next_rescan = datetime.now(timezone.utc) + RESCAN_INTERVAL
+        while True:
+            now = datetime.now(timezone.utc)
+            if self.listen and self._listener is None:
+                try:
+                    self._connect_listener()
+                except Exception as e:
+                    print(f"Could not LISTEN for new bets, relying on rescans: {e}")
+            if now >= self._next_rescan:
+                self.load_pending()
+                self._next_rescan = now + RESCAN_INTERVAL
+            self.run_due(now)
+
+            wake_at = self._next_rescan
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            timeout = max(0.0, (wake_at - datetime.now(timezone.utc)).total_seconds())
+            placed = self._wait(timeout)
+            if placed:
+                self.load_pending(placed)
+
+
+if __name__ == "__main__":
+    SettlementScheduler().run_forever()
@@ -0,0 +1,54 @@
+import os
+from psycopg2.extras import execute_values
+
+# Hours after which an article counts for half as much as one seen now
+HALF_LIFE_HOURS = float(os.getenv('TEAM_SENTIMENT_HALF_LIFE_HOURS', '48'))
+
+
+def fold_articles(cur, observations, half_life_hours=HALF_LIFE_HOURS):
+    """
+    Fold (team, article_hash, score) observations into each team's decayed
+    sentiment state and return how many were new. Articles already folded into
+    a team are ignored, so the cost of a run follows the number of new
+    articles, not the size of the history.
+
+    A team's state is a weighted sum and total weight. Before new articles are
+    added both are decayed by 2 ** (-hours since last update / half life), which
+    keeps the mean an exponentially time-weighted average of every article seen.
+    Runs in the caller's transaction.
+    """
+    observations = list({(team, hash_): (team, hash_, score) for team, hash_, score in observations}.values())
+    if not observations:
+        return 0
+    decay = f"power(0.5, extract(epoch FROM now() - team_sentiment.updated_at) / 3600.0 / {float(half_life_hours)!r})"
+    fold_sql = f"""
+        WITH fresh AS (
+            INSERT INTO team_sentiment_articles (team, article_hash, score)
+            VALUES %s
+            ON CONFLICT (team, article_hash) DO NOTHING
+            RETURNING team, score
+        ),
+        folded AS (
+            INSERT INTO team_sentiment (team, weighted_sum, weight, articles, updated_at)
+            SELECT team, SUM(score), COUNT(*), COUNT(*), now()
+            FROM fresh
+            GROUP BY team
+            ON CONFLICT (team) DO UPDATE SET
+                weighted_sum = team_sentiment.weighted_sum * {decay} + EXCLUDED.weighted_sum,
+                weight = team_sentiment.weight * {decay} + EXCLUDED.weight,
+                articles = team_sentiment.articles + EXCLUDED.articles,
+                updated_at = EXCLUDED.updated_at
+        )
+        SELECT COUNT(*) FROM fresh
+    """
+    (new,) = execute_values(cur, fold_sql, observations, page_size=len(observations), fetch=True)[0]
+    return new
+
+
+def team_sentiments(cur, teams):
+    """{team: (decayed mean sentiment, articles folded in)} for the teams that have any state."""
+    cur.execute(
+        "SELECT team, weighted_sum / weight, articles FROM team_sentiment WHERE team = ANY(%s) AND weight > 0",
+        (list(teams),),
+    )
+    return {team: (mean, articles) for team, mean, articles in cur.fetchall()}
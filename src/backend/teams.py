@@ -0,0 +1,29 @@
+# Alternative names the news sites and bookmakers use for teams, keyed by the
+# name the Odds API returns. Extend as new mismatches show up, but leave out
+# nicknames other clubs share across sports ("Spurs", "Chiefs", "Warriors",
+# "Wolves", "Newcastle"): the scraper would credit every such headline to this team.
+TEAM_ALIASES = {
+    "Manchester United": ["Man United", "Man Utd"],
+    "Manchester City": ["Man City"],
+    "Tottenham Hotspur": ["Tottenham"],
+    "Wolverhampton Wanderers": ["Wolverhampton"],
+    "Brighton and Hove Albion": ["Brighton"],
+    "Newcastle United": ["Newcastle Utd"],
+    "West Ham United": ["West Ham"],
+    "Nottingham Forest": ["Nott'm Forest"],
+    "Paris Saint Germain": ["PSG", "Paris Saint-Germain"],
+    "Inter Milan": ["Internazionale"],
+    "Los Angeles Lakers": ["LA Lakers", "Lakers"],
+    "Los Angeles Clippers": ["LA Clippers", "Clippers"],
+    "Golden State Warriors": ["Golden State"],
+    "Philadelphia 76ers": ["76ers", "Sixers"],
+    "New York Knicks": ["Knicks"],
+    "Boston Celtics": ["Celtics"],
+    "Kansas City Chiefs": ["KC Chiefs"],
+    "San Francisco 49ers": ["49ers", "Niners"],
+}
+
+
+def team_names(team, aliases=TEAM_ALIASES):
+    """The team's own name followed by its aliases."""
+    return [team, *aliases.get(team, ())]
@@ -0,0 +1,126 @@
+import threading
+import time
+import psycopg2.extensions
+import pytest
+from db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.health_checks = 0
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                connection.health_checks += 1
+
+        return Cursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    pool = ConnectionPool("stub", **kwargs)
+    pool.opened = []
+
+    def connect():
+        conn = FakeConnection()
+        pool.opened.append(conn)
+        return conn
+
+    pool._connect = connect
+    return pool
+
+
+def test_concurrent_checkouts_reuse_idle_connections():
+    pool = make_pool(minconn=1, maxconn=10)
+
+    def worker():
+        for _ in range(50):
+            with pool.connection():
+                time.sleep(0.001)
+            time.sleep(0.0005)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.stats()["checkouts"] == 400
+    # One per thread at most, never one per checkout
+    assert len(pool.opened) <= 8
+    assert pool.stats()["idle"] == len(pool.opened)
+    assert not any(conn.closed for conn in pool.opened)
+
+
+def test_idle_connections_are_kept_up_to_maxconn():
+    pool = make_pool(minconn=0, maxconn=2)
+    held = [pool._checkout() for _ in range(3)]
+    for conn in held:
+        pool._checkin(conn)
+    assert pool.stats()["idle"] == 2
+    assert [conn.closed for conn in held] == [0, 0, 1]
+
+
+def test_health_check_only_after_idle_timeout():
+    pool = make_pool(minconn=0, maxconn=2, health_check_after=30)
+    with pool.connection() as conn:
+        pass
+    # Freshly opened, then reused straight away: no SELECT 1 either time
+    with pool.connection() as again:
+        assert again is conn
+    assert conn.health_checks == 0
+
+    pool._idle = [(conn, time.monotonic() - 60)]
+    with pool.connection() as again:
+        assert again is conn
+    assert conn.health_checks == 1
+
+
+def test_broken_idle_connection_is_replaced():
+    pool = make_pool(minconn=0, maxconn=2)
+    with pool.connection() as conn:
+        pass
+    conn.closed = 2
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_failed_connect_releases_the_slot():
+    pool = make_pool(minconn=0, maxconn=1, timeout=0.1)
+
+    def refuse():
+        raise psycopg2.OperationalError("connection refused")
+
+    pool._connect = refuse
+    for _ in range(3):
+        with pytest.raises(psycopg2.OperationalError):
+            with pool.connection():
+                pass
+    assert pool.stats()["in_use"] == 0
+
+
+def test_checkout_times_out_when_every_slot_is_taken():
+    pool = make_pool(minconn=0, maxconn=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    assert pool.stats()["timeouts"] == 1
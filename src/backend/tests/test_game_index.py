@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from game_index import GameIndex, normalize_name
+
+
+def game(game_id, home, away, commence_time, sport="basketball_nba"):
+    return {"id": game_id, "sport_key": sport, "home_team": home, "away_team": away, "commence_time": commence_time}
+
+
+def test_normalize_name_strips_accents_and_punctuation():
+    assert normalize_name("  Atlético   Madrid. ") == "atletico madrid"
+
+
+def test_aliases_and_swapped_sides_match():
+    index = GameIndex([game("g1", "Los Angeles Lakers", "Boston Celtics", "2026-10-20T18:00:00Z")])
+    assert index.find("LA Lakers", "Celtics", "2026-10-20T18:20:00Z")["id"] == "g1"
+    assert index.find("Boston Celtics", "Lakers", "2026-10-20T18:00:00Z")["id"] == "g1"
+    assert index.find("Lakers", "Bulls", "2026-10-20T18:00:00Z") is None
+
+
+def test_closest_game_within_tolerance_wins():
+    index = GameIndex(
+        [game("g1", "A", "B", "2026-10-20T17:00:00Z"), game("g2", "A", "B", "2026-10-20T21:00:00Z")],
+        tolerance=timedelta(minutes=30),
+    )
+    assert index.find("A", "B", "2026-10-20T20:45:00Z")["id"] == "g2"
+    assert index.find("A", "B", "2026-10-20T17:10:00Z")["id"] == "g1"
+    assert index.find("A", "B", "2026-10-20T19:00:00Z") is None
+
+
+def test_sport_filter_skips_other_sports():
+    index = GameIndex(
+        [game("nba", "A", "B", "2026-10-20T18:00:00Z"), game("nfl", "A", "B", "2026-10-20T18:05:00Z", sport="americanfootball_nfl")]
+    )
+    assert index.find("A", "B", "2026-10-20T18:05:00Z", sport="basketball_nba")["id"] == "nba"
+    assert index.find("A", "B", "2026-10-20T18:00:00Z", sport="americanfootball_nfl")["id"] == "nfl"
+    assert index.find("A", "B", "2026-10-20T18:00:00Z", sport="icehockey_nhl") is None
@@ -0,0 +1,46 @@
+import random
+import re
+from lexicon import negation_words, score_articles, sentiment_lexicon
+
+
+def analyze_sentiment_loop(text):
+    # The original word-by-word scorer from sentiment.py
+    words = re.sub(r'[^\w\s]', '', text.lower()).split()
+    total_score = 0
+    skip_next = False
+    for i, word in enumerate(words):
+        if skip_next:
+            skip_next = False
+            continue
+        if word in negation_words and i + 1 < len(words):
+            if words[i + 1] in sentiment_lexicon:
+                total_score -= sentiment_lexicon[words[i + 1]]
+                skip_next = True
+            continue
+        total_score += sentiment_lexicon.get(word, 0)
+    return total_score
+
+
+def random_texts(n, seed=3):
+    rng = random.Random(seed)
+    # Negations are over-represented so "not not good" style runs come up
+    vocab = list(sentiment_lexicon) + sorted(negation_words) * 3 + ["the", "team", "Coach", "won't", "it's"]
+    punctuation = ["", "", "", ".", ",", "!", "'s"]
+    return [
+        " ".join(rng.choice(vocab).upper() if rng.random() < 0.1 else rng.choice(vocab) + rng.choice(punctuation)
+                 for _ in range(rng.randint(0, 60)))
+        for _ in range(n)
+    ]
+
+
+def test_matches_the_original_loop():
+    texts = random_texts(3000) + ["", "not", "good not", "not good", "not not good", "never, ever good"]
+    scores = score_articles(texts)
+    assert len(scores) == len(texts)
+    for text, score in zip(texts, scores.tolist()):
+        assert abs(score - analyze_sentiment_loop(text)) < 1e-9, text
+
+
+def test_negation_does_not_carry_into_the_next_article():
+    # Scored together, "not" ending one article must not flip the next one's first word
+    assert score_articles(["it was not", "good"]).tolist() == [0.0, sentiment_lexicon["good"]]
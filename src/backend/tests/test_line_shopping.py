@@ -0,0 +1,60 @@
+import random
+from line_shopping import shop_lines
+
+
+def best_odds_loop(event, market="h2h"):
+    # fetch_h2h's original per-event loop: the first bookmaker seen keeps a tied price
+    best_odds, best_bookmaker = {}, {}
+    for bookmaker in event["bookmakers"]:
+        for m in bookmaker["markets"]:
+            if m["key"] == market:
+                for outcome in m["outcomes"]:
+                    team, price = outcome["name"], outcome["price"]
+                    if team not in best_odds or price > best_odds[team]:
+                        best_odds[team] = price
+                        best_bookmaker[team] = bookmaker["title"]
+    return {team: (price, best_bookmaker[team]) for team, price in best_odds.items()}
+
+
+def random_events(n_events, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for i in range(n_events):
+        teams = [f"Home {i}", f"Away {i}"] + (["Draw"] if rng.random() < 0.3 else [])
+        bookmakers = []
+        for b in range(rng.randint(0, 8)):
+            markets = [{"key": "spreads", "outcomes": [{"name": team, "price": 1.91} for team in teams]}]
+            if rng.random() < 0.9:
+                # Few distinct prices, so ties between bookmakers are common
+                outcomes = [{"name": team, "price": rng.choice((1.5, 1.9, 2.0, 2.1, 3.25))}
+                            for team in teams if rng.random() < 0.95]
+                markets.append({"key": "h2h", "outcomes": outcomes})
+            bookmakers.append({"key": f"book_{b}", "title": f"Book {b}", "markets": markets})
+        events.append({"id": f"game-{i}", "home_team": teams[0], "away_team": teams[1], "bookmakers": bookmakers})
+    return events
+
+
+def test_best_prices_match_the_original_loop():
+    events = random_events(500)
+    lines = shop_lines(events)
+    assert len(lines) == len(events)
+    for event, line in zip(events, lines):
+        assert line["best"] == best_odds_loop(event)
+
+
+def test_second_best_and_arbitrage_margin():
+    event = {"id": "g", "home_team": "A", "away_team": "B", "bookmakers": [
+        {"key": "x", "title": "X", "markets": [{"key": "h2h", "outcomes": [{"name": "A", "price": 2.2}, {"name": "B", "price": 1.7}]}]},
+        {"key": "y", "title": "Y", "markets": [{"key": "h2h", "outcomes": [{"name": "A", "price": 1.9}, {"name": "B", "price": 2.1}]}]},
+    ]}
+    [line] = shop_lines([event])
+    assert line["best"] == {"A": (2.2, "X"), "B": (2.1, "Y")}
+    assert line["second_best"] == {"A": 1.9, "B": 1.7}
+    assert abs(line["arb_margin"] - (1 - 1 / 2.2 - 1 / 2.1)) < 1e-12
+    assert abs(sum(line["no_vig"].values()) - 1) < 1e-12
+
+
+def test_events_without_prices():
+    assert shop_lines([{"id": "g", "home_team": "A", "away_team": "B", "bookmakers": []}]) == [
+        {"best": {}, "second_best": {}, "no_vig": {}, "arb_margin": None}
+    ]
@@ -0,0 +1,20 @@
+from link_matcher import TeamMatcher
+
+
+def test_shared_nicknames_are_not_credited_to_another_sport():
+    matcher = TeamMatcher(["Tottenham Hotspur", "San Antonio Spurs"])
+    assert matcher.teams_in("Spurs beat Rockets") == set()
+    assert matcher.teams_in("San Antonio Spurs beat Rockets") == {"San Antonio Spurs"}
+    assert matcher.teams_in("Tottenham held at home") == {"Tottenham Hotspur"}
+
+
+def test_aliases_match_on_word_boundaries():
+    matcher = TeamMatcher(["Los Angeles Lakers", "Miami Heat"])
+    assert matcher.teams_in("LA Lakers and Heat agree trade") == {"Los Angeles Lakers"}
+    assert matcher.teams_in("Lakers fan flies out of Heathrow") == {"Los Angeles Lakers"}
+
+
+def test_match_links_resolves_relative_hrefs():
+    matcher = TeamMatcher(["Boston Celtics"])
+    html = '<a href="/story/1">Celtics win</a><a href="https://x.test/2">Other news</a><a href="/3"></a>'
+    assert matcher.match_links(html, "https://news.test/sport/") == {"Boston Celtics": ["https://news.test/story/1"]}
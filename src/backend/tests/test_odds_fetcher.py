@@ -0,0 +1,58 @@
+from odds_fetcher import merge_events
+
+
+def listing(home, away, commence_time, *bookmakers, game_id=None):
+    event = {
+        "sport_key": "basketball_nba",
+        "home_team": home,
+        "away_team": away,
+        "commence_time": commence_time,
+        "bookmakers": [{"key": key, "title": key.title(), "markets": []} for key in bookmakers],
+    }
+    if game_id is not None:
+        event["id"] = game_id
+    return event
+
+
+def books(event):
+    return [bookmaker["key"] for bookmaker in event["bookmakers"]]
+
+
+def test_regions_merge_by_id_and_list_each_bookmaker_once():
+    us = [listing("A", "B", "2026-10-20T18:00:00Z", "fanduel", "pinnacle", game_id="g1")]
+    eu = [listing("A", "B", "2026-10-20T18:00:00Z", "pinnacle", "betfair", game_id="g1")]
+    [event] = merge_events([us, eu])
+    assert event["id"] == "g1"
+    assert books(event) == ["fanduel", "pinnacle", "betfair"]
+
+
+def test_same_game_under_another_name_merges_through_the_index():
+    us = [listing("Los Angeles Lakers", "Boston Celtics", "2026-10-20T18:00:00Z", "fanduel", game_id="g1")]
+    eu = [listing("Boston Celtics", "LA Lakers", "2026-10-20T18:10:00Z", "betfair", game_id="g1-eu")]
+    assert len(merge_events([us, eu])) == 2  # ids disagree: two games
+    eu[0].pop("id")
+    [event] = merge_events([us, eu])
+    assert event["id"] == "g1" and books(event) == ["fanduel", "betfair"]
+
+
+def test_id_less_listings_stay_separate_games():
+    us = [listing("P", "Q", "2026-10-20T18:00:00Z", "a"), listing("R", "S", "2026-10-20T18:00:00Z", "b")]
+    eu = [listing("R", "S", "2026-10-20T18:00:00Z", "c"), listing("V", "W", None, "d")]
+    events = merge_events([us, eu])
+    assert [(event["home_team"], books(event)) for event in events] == [("P", ["a"]), ("R", ["b", "c"]), ("V", ["d"])]
+    assert not any("id" in event for event in events)
+
+
+def test_id_less_listing_takes_the_id_of_a_later_one():
+    first = [listing("A", "B", "2026-10-20T18:00:00Z", "a")]
+    later = [listing("A", "B", "2026-10-20T18:00:00Z", "b", game_id="real")]
+    again = [listing("A", "B", "2026-10-20T18:00:00Z", "c", game_id="real")]
+    [event] = merge_events([first, later, again])
+    assert event["id"] == "real"
+    assert books(event) == ["a", "b", "c"]
+
+
+def test_games_further_apart_than_the_tolerance_are_not_merged():
+    first = [listing("A", "B", "2026-10-20T13:00:00Z", "a")]
+    second = [listing("A", "B", "2026-10-20T17:00:00Z", "b")]
+    assert len(merge_events([first, second])) == 2
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+from paper_bet import find_game, index_games, scores_to_fetch, settle_outcomes
+
+# A doubleheader: the same two teams, four hours apart
+G1 = {
+    "id": "g1",
+    "sport_key": "baseball_mlb",
+    "home_team": "New York Yankees",
+    "away_team": "Boston Red Sox",
+    "commence_time": "2026-10-20T17:00:00Z",
+    "completed": True,
+    "scores": [{"name": "New York Yankees", "score": "5"}, {"name": "Boston Red Sox", "score": "3"}],
+}
+G2 = dict(G1, id="g2", commence_time="2026-10-20T21:00:00Z")
+
+
+def bet(bet_id, game_id, event_time, chosen_team="New York Yankees", sport="baseball_mlb"):
+    return {
+        "bet_id": bet_id,
+        "game_id": game_id,
+        "sport": sport,
+        "home_team": "New York Yankees",
+        "away_team": "Boston Red Sox",
+        "event_time": datetime.fromisoformat(event_time).replace(tzinfo=timezone.utc),
+        "chosen_team": chosen_team,
+        "stake": 10,
+        "odds": 2.5,
+    }
+
+
+def test_bet_with_game_id_never_falls_back_to_another_game():
+    games = {"g1": G1}
+    found = find_game(bet(1, "g2", "2026-10-20T21:00:00"), games, index_games(games))
+    assert found is None
+
+
+def test_bet_without_game_id_matches_the_right_half_of_a_doubleheader():
+    games = {"g1": G1, "g2": G2}
+    index = index_games(games)
+    assert find_game(bet(1, None, "2026-10-20T21:05:00"), games, index)["id"] == "g2"
+    assert find_game(bet(2, None, "2026-10-20T17:00:00"), games, index)["id"] == "g1"
+    assert find_game(bet(3, None, "2026-10-20T19:00:00"), games, index) is None
+    assert find_game(bet(4, None, "2026-10-20T17:00:00", sport="basketball_nba"), games, index) is None
+
+
+def test_settle_outcomes():
+    draw = dict(G1, id="g3", scores=[{"name": "New York Yankees", "score": "2"}, {"name": "Boston Red Sox", "score": "2"}])
+    broken = dict(G1, id="g4", scores=[{"name": "New York Yankees", "score": "?"}])
+    games = {"g1": G1, "g3": draw, "g4": broken}
+    pending = [
+        bet(1, "g1", "2026-10-20T17:00:00"),
+        bet(2, "g1", "2026-10-20T17:00:00", chosen_team="Boston Red Sox"),
+        bet(3, "g3", "2026-10-20T17:00:00"),
+        bet(4, "g4", "2026-10-20T17:00:00"),
+        bet(5, "g2", "2026-10-20T21:00:00"),
+    ]
+    assert settle_outcomes(pending, games) == [(1, "won", 25.0), (2, "lost", 0), (3, "lost", 0)]
+
+
+def test_scores_to_fetch_wants_the_feed_for_an_uncached_game():
+    now = datetime(2026, 10, 21, 12, tzinfo=timezone.utc)
+    pending = [bet(1, "g1", "2026-10-20T17:00:00"), bet(2, "g2", "2026-10-20T21:00:00")]
+    assert scores_to_fetch(pending, {"g1": G1}, {}, now) == {"baseball_mlb": 1}
+    assert scores_to_fetch(pending, {"g1": G1, "g2": G2}, {}, now) == {}
+    recent = {"baseball_mlb": now - timedelta(minutes=1)}
+    assert scores_to_fetch(pending, {"g1": G1}, recent, now) == {}
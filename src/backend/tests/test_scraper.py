@@ -0,0 +1,87 @@
+import collections
+import http.server
+import threading
+import pytest
+from http_cache import HttpCache
+from scraper import Scraper
+
+PAGES = {
+    "/": '<a href="/a1">Lakers rally late</a> <a href="/a2">Celtics and Lakers trade</a> <a href="/gone">Celtics news</a>',
+    "/other": '<a href="/a2">Celtics and Lakers trade</a>',
+    "/a1": "<html><p>The Lakers won.</p><p>Great game.</p></html>",
+    "/a2": "<html><p>A blockbuster trade.</p></html>",
+}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # A stand-in news site: fixed pages with ETags, 304 on a matching If-None-Match
+    def do_GET(self):
+        self.server.hits[self.path] += 1
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{hash(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.not_modified[self.path] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.hits = collections.Counter()
+    server.not_modified = collections.Counter()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_each_page_and_article_is_fetched_once(site):
+    server, base = site
+    scraper = Scraper(max_workers=4)
+    try:
+        articles = scraper.scrape(["Los Angeles Lakers", "Boston Celtics"], [f"{base}/", f"{base}/other", f"{base}/"])
+    finally:
+        scraper.close()
+    # Front pages finish in any order, and so do their links
+    assert {team: sorted(texts) for team, texts in articles.items()} == {
+        "Los Angeles Lakers": ["A blockbuster trade.", "The Lakers won. Great game."],
+        "Boston Celtics": ["A blockbuster trade."],
+    }
+    assert server.hits == {"/": 1, "/other": 1, "/a1": 1, "/a2": 1, "/gone": 1}
+
+
+def test_cache_serves_fresh_articles_and_revalidates_stale_pages(site, tmp_path):
+    server, base = site
+    # Front pages expire straight away; articles use the scraper's long article TTL
+    cache = HttpCache(str(tmp_path / "cache.sqlite3"), default_ttl=0)
+    teams, urls = ["Los Angeles Lakers"], [f"{base}/"]
+    try:
+        for _ in range(2):
+            scraper = Scraper(max_workers=4, cache=cache)
+            try:
+                articles = scraper.scrape(teams, urls)
+            finally:
+                scraper.close()
+            assert sorted(articles["Los Angeles Lakers"]) == ["A blockbuster trade.", "The Lakers won. Great game."]
+    finally:
+        cache.close()
+    assert server.hits == {"/": 2, "/a1": 1, "/a2": 1}
+    assert server.not_modified == {"/": 1}
+    assert cache.stats == {"hits": 2, "revalidated": 1, "misses": 3, "evictions": 0}
@@ -0,0 +1,71 @@
+import random
+from decimal import Decimal
+import numpy as np
+from staking import AWAY, HOME, stake_batch
+
+
+def decide_bets_loop(events, bankroll, threshold=1.5, edge=0.05, fractional_kelly=0.5):
+    # The original per-event decide_bets; odds come out of Postgres as Decimal
+    bets = []
+    for home_odds, away_odds in events:
+        raw_home, raw_away = 1 / home_odds, 1 / away_odds
+        imp_home = raw_home / (raw_home + raw_away)
+        imp_away = raw_away / (raw_home + raw_away)
+        if abs(home_odds - away_odds) >= threshold:
+            if home_odds > away_odds:
+                side, adjusted_prob, chosen_odds = HOME, float(imp_home) + edge, home_odds
+            else:
+                side, adjusted_prob, chosen_odds = AWAY, float(imp_away) + edge, away_odds
+        elif home_odds < away_odds:
+            side, adjusted_prob, chosen_odds = HOME, float(imp_home) + edge / 2, home_odds
+        else:
+            side, adjusted_prob, chosen_odds = AWAY, float(imp_away) + edge / 2, away_odds
+        adjusted_prob = min(adjusted_prob, 1.0)
+        b = chosen_odds - 1
+        if b <= 0:
+            bets.append(None)
+            continue
+        kelly_fraction = (float(b) * adjusted_prob - (1 - adjusted_prob)) / float(b)
+        kelly_fraction = max(0, min(kelly_fraction * fractional_kelly, 1))
+        bet_amount = bankroll * kelly_fraction
+        bets.append((side, float(chosen_odds), kelly_fraction, bet_amount) if bet_amount > 0 else None)
+    return bets
+
+
+def random_odds(n, seed=11):
+    rng = random.Random(seed)
+    odds = []
+    for _ in range(n):
+        p = rng.uniform(0.05, 0.95)
+        margin = rng.uniform(1.0, 1.1)
+        odds.append((Decimal(str(round(1 / (p * margin), 2))), Decimal(str(round(1 / ((1 - p) * margin), 2)))))
+    # Exact threshold differences, even odds and a price of 1.0
+    odds += [(Decimal("2.84"), Decimal("1.34")), (Decimal("1.34"), Decimal("2.84")),
+             (Decimal("1.95"), Decimal("1.95")), (Decimal("1.00"), Decimal("9.00"))]
+    return odds
+
+
+def test_matches_the_original_loop_without_the_exposure_cap():
+    events = random_odds(2000)
+    expected = decide_bets_loop(events, 1000)
+    stakes = stake_batch([h for h, _ in events], [a for _, a in events], 1000, max_exposure=None)
+    assert stakes["bet"].tolist() == [bet is not None for bet in expected]
+    for i, bet in enumerate(expected):
+        if bet is None:
+            continue
+        side, odds, kelly_fraction, amount = bet
+        assert stakes["side"][i] == side
+        assert stakes["odds"][i] == odds
+        assert abs(stakes["kelly_fraction"][i] - kelly_fraction) < 1e-12
+        assert abs(stakes["amount"][i] - amount) < 1e-9
+
+
+def test_exposure_cap_scales_every_stake_equally():
+    events = random_odds(200)
+    home, away = [h for h, _ in events], [a for _, a in events]
+    uncapped = stake_batch(home, away, 1000, max_exposure=None)
+    capped = stake_batch(home, away, 1000, max_exposure=0.5)
+    assert uncapped["kelly_fraction"].sum() > 0.5
+    assert abs(capped["kelly_fraction"].sum() - 0.5) < 1e-12
+    scale = 0.5 / uncapped["kelly_fraction"].sum()
+    assert np.allclose(capped["amount"], uncapped["amount"] * scale)